@@ -483,14 +483,6 @@ public object FfiConverterByteArray : FfiConverterRustBuffer<ByteArray> {
 public typealias CustomType = ByteArray
 public typealias FfiConverterTypeCustomType = FfiConverterByteArray
 
-/**
- * Typealias from the type name used in the UDL file to the builtin type.  This
- * is needed because the UDL type name is used in function/method signatures.
- * It's also what we have an external type that references a custom type.
- */
-public typealias CustomType = List<UByte>
-public typealias FfiConverterTypeCustomType = FfiConverterSequenceUByte
-
 fun `testFn`(`typeParam`: CustomType) =
 
     rustCall() { _status ->
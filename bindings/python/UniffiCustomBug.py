@@ -15,17 +15,29 @@
 
 import os
 import sys
+import array
 import ctypes
-import enum
+import collections
 import struct
 import contextlib
-import datetime
-import typing
-import platform
+import itertools
+import threading
+import time
 
 # Used for default argument values
 DEFAULT = object()
 
+# Hooks of the hand-written runtime in _uniffi_custom_bug_runtime.py, installed by its
+# `uniffi_enable_*` functions.  The hot paths below only check these, and they are None while
+# the feature is disabled.
+_uniffi_rustbuffer_pool = None
+_uniffi_lift_cache = None
+_uniffi_lower_cache = None
+_uniffi_buffer_tracker = None
+_uniffi_instrumentation = None
+_uniffi_batched_callbacks = None
+_uniffi_async_batcher = None
+
 
 class RustBuffer(ctypes.Structure):
     _fields_ = [
@@ -36,14 +48,50 @@ class RustBuffer(ctypes.Structure):
 
     @staticmethod
     def alloc(size):
-        return rust_call(_UniFFILib.ffi_UniffiCustomBug_rustbuffer_alloc, size)
+        _uniffi_check_buffer_size(size)
+        if _uniffi_instrumentation is not None:
+            _uniffi_instrumentation.count_buffer("alloc", size)
+        pool = _uniffi_rustbuffer_pool
+        if pool is not None:
+            rbuf = pool.alloc(size)
+        else:
+            rbuf = _uniffi_call_rustbuffer_alloc(size)
+        if _uniffi_buffer_tracker is not None:
+            _uniffi_buffer_tracker.track(rbuf)
+        return rbuf
 
     @staticmethod
     def reserve(rbuf, additional):
-        return rust_call(_UniFFILib.ffi_UniffiCustomBug_rustbuffer_reserve, rbuf, additional)
+        if _uniffi_instrumentation is not None:
+            _uniffi_instrumentation.count_buffer("reserve", additional)
+        result = _uniffi_call_rustbuffer_reserve(rbuf, additional)
+        if _uniffi_buffer_tracker is not None:
+            _uniffi_buffer_tracker.untrack(rbuf)
+            _uniffi_buffer_tracker.track(result)
+        return result
 
     def free(self):
-        return rust_call(_UniFFILib.ffi_UniffiCustomBug_rustbuffer_free, self)
+        if _uniffi_instrumentation is not None:
+            _uniffi_instrumentation.count_buffer("free", self.capacity)
+        if _uniffi_buffer_tracker is not None:
+            _uniffi_buffer_tracker.untrack(self)
+        pool = _uniffi_rustbuffer_pool
+        if pool is not None:
+            return pool.release(self)
+        return _uniffi_call_rustbuffer_free(self)
+
+    def asMemoryview(self, size=None):
+        """
+        Map the first `size` bytes of the buffer (default: `len`) as a writable memoryview.
+
+        Nothing is copied, so the view must not be used once the buffer is freed or reserved.
+        """
+        if size is None:
+            size = self.len
+        if size == 0:
+            return memoryview(bytearray())
+        address = ctypes.cast(self.data, ctypes.c_void_p).value
+        return memoryview((ctypes.c_char * size).from_address(address)).cast("B")
 
     def __str__(self):
         return "RustBuffer(capacity={}, len={}, data={})".format(
@@ -53,13 +101,14 @@ class RustBuffer(ctypes.Structure):
         )
 
     @contextlib.contextmanager
-    def allocWithBuilder(*args):
+    def allocWithBuilder(capacity=16):
         """Context-manger to allocate a buffer using a RustBufferBuilder.
 
         The allocated buffer will be automatically freed if an error occurs, ensuring that
-        we don't accidentally leak it.
+        we don't accidentally leak it.  Pass the exact size as `capacity` when it's known, so
+        the builder never has to grow the buffer.
         """
-        builder = RustBufferBuilder()
+        builder = RustBufferBuilder(capacity)
         try:
             yield builder
         except:
@@ -73,12 +122,15 @@ class RustBuffer(ctypes.Structure):
         The RustBuffer will be freed once the context-manager exits, ensuring that we don't
         leak it even if an error occurs.
         """
+        s = None
         try:
             s = RustBufferStream.from_rust_buffer(self)
             yield s
             if s.remaining() != 0:
                 raise RuntimeError("junk data left in buffer at end of consumeWithStream")
         finally:
+            if s is not None:
+                s.data.release()
             self.free()
 
     @contextlib.contextmanager
@@ -102,84 +154,308 @@ class ForeignBytes(ctypes.Structure):
     def __str__(self):
         return "ForeignBytes(len={}, data={})".format(self.len, self.data[0:self.len])
 
+class _UniFfiPyBuffer(ctypes.Structure):
+    # CPython's `Py_buffer`, see `uniffi_borrow_bytes`
+    _fields_ = [
+        ("buf", ctypes.c_void_p),
+        ("obj", ctypes.c_void_p),
+        ("len", ctypes.c_ssize_t),
+        ("itemsize", ctypes.c_ssize_t),
+        ("readonly", ctypes.c_int),
+        ("ndim", ctypes.c_int),
+        ("format", ctypes.c_char_p),
+        ("shape", ctypes.POINTER(ctypes.c_ssize_t)),
+        ("strides", ctypes.POINTER(ctypes.c_ssize_t)),
+        ("suboffsets", ctypes.POINTER(ctypes.c_ssize_t)),
+        ("internal", ctypes.c_void_p),
+    ]
+
+if sys.implementation.name == "cpython":
+    ctypes.pythonapi.PyObject_GetBuffer.argtypes = (ctypes.py_object, ctypes.POINTER(_UniFfiPyBuffer), ctypes.c_int)
+    ctypes.pythonapi.PyObject_GetBuffer.restype = ctypes.c_int
+    ctypes.pythonapi.PyBuffer_Release.argtypes = (ctypes.POINTER(_UniFfiPyBuffer),)
+    ctypes.pythonapi.PyBuffer_Release.restype = None
+
+@contextlib.contextmanager
+def uniffi_borrow_bytes(value):
+    """
+    Context-manager to lend the memory of a bytes-like object to Rust as ForeignBytes.
+
+    Nothing is copied: the ForeignBytes point into `value` (a `bytes`, `bytearray`, `mmap.mmap`,
+    contiguous `memoryview`, ...), which is kept exported, so it can't be resized or closed,
+    until the context-manager exits.  On interpreters other than CPython, read-only buffers
+    other than `bytes` are copied.
+    """
+    if type(value) is bytes:
+        size = len(value)
+        data = ctypes.cast(ctypes.c_char_p(value), ctypes.POINTER(ctypes.c_char))
+        view = None
+    elif sys.implementation.name == "cpython":
+        view = _UniFfiPyBuffer()
+        # PyBUF_SIMPLE: contiguous bytes, without format or shape
+        ctypes.pythonapi.PyObject_GetBuffer(value, ctypes.byref(view), 0)
+        size = view.len
+        data = ctypes.cast(view.buf, ctypes.POINTER(ctypes.c_char))
+    else:
+        view = memoryview(value).cast("B")
+        size = view.nbytes
+        if view.readonly:
+            view = bytearray(view)
+        data = ctypes.cast((ctypes.c_char * size).from_buffer(view), ctypes.POINTER(ctypes.c_char))
+    try:
+        if size > _RUST_BUFFER_MAX_SIZE:
+            raise ValueError("ForeignBytes are limited to {} bytes, got {}".format(_RUST_BUFFER_MAX_SIZE, size))
+        yield ForeignBytes(size, data)
+    finally:
+        if isinstance(view, _UniFfiPyBuffer):
+            ctypes.pythonapi.PyBuffer_Release(ctypes.byref(view))
+
+class RustBufferView:
+    """
+    Zero-copy view of a value lifted from a RustBuffer.
+
+    This owns the RustBuffer: it is freed when `release()` is called, when the `with` block
+    exits or when the view is garbage collected.  `data` (and any slice taken from it) must not
+    be used after that.
+    """
+
+    __slots__ = ("_rbuf", "data")
+
+    def __init__(self, rbuf, offset, size):
+        self.data = rbuf.asMemoryview()[offset:offset + size].toreadonly()
+        self._rbuf = rbuf
+        if _uniffi_buffer_tracker is not None:
+            # Received from Rust, and live for as long as the view holds on to it
+            _uniffi_buffer_tracker.track(rbuf)
+
+    def __len__(self):
+        return self.data.nbytes
+
+    def __bytes__(self):
+        return self.tobytes()
+
+    def tobytes(self):
+        return self.data.tobytes()
+
+    def decode(self, encoding="utf-8"):
+        return str(self.data, encoding)
+
+    def release(self):
+        if getattr(self, "_rbuf", None) is not None:
+            # Raises BufferError, and keeps the buffer alive, if something still exports `data`.
+            self.data.release()
+            rbuf = self._rbuf
+            self._rbuf = None
+            rbuf.free()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def __del__(self):
+        self.release()
+
+class RustBufferChunks:
+    """
+    Iterator over the byte string in a RustBuffer, in `bytes` chunks.
+
+    This is a chunked view of a buffer that Rust already returned whole, not a stream from Rust:
+    the value is still limited to 2 GiB and held once in Rust memory.  What it saves is the
+    second, Python-side copy of the whole value.
+
+    Like RustBufferView, this owns the RustBuffer: it is freed when the iterator is exhausted,
+    when `close()` is called, when the `with` block exits or when it is garbage collected.
+    """
+
+    __slots__ = ("_rbuf", "_view", "_offset", "_end", "_chunk_size")
+
+    def __init__(self, rbuf, chunk_size):
+        self._rbuf = None
+        try:
+            if chunk_size < 1:
+                raise ValueError("chunk_size must be at least 1")
+            view = rbuf.asMemoryview()
+            if len(view) < 4:
+                raise InternalError("read past end of rust buffer")
+            size = _UNIFFI_STRUCT_I32.unpack_from(view, 0)[0]
+            if size < 0:
+                raise InternalError("Unexpected negative byte string length")
+            if 4 + size > len(view):
+                raise InternalError("read past end of rust buffer")
+            if 4 + size != len(view):
+                raise RuntimeError("junk data left in buffer at end of consumeWithStream")
+        except:
+            rbuf.free()
+            raise
+        self._rbuf = rbuf
+        if _uniffi_buffer_tracker is not None:
+            _uniffi_buffer_tracker.track(rbuf)
+        self._view = view
+        self._offset = 4
+        self._end = 4 + size
+        self._chunk_size = chunk_size
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._rbuf is None:
+            raise StopIteration
+        if self._offset >= self._end:
+            self.close()
+            raise StopIteration
+        start = self._offset
+        self._offset = min(start + self._chunk_size, self._end)
+        return self._view[start:self._offset].tobytes()
+
+    def close(self):
+        if getattr(self, "_rbuf", None) is not None:
+            self._view.release()
+            rbuf = self._rbuf
+            self._rbuf = None
+            rbuf.free()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+# `capacity` and `len` are i32 on both sides of the FFI.
+_RUST_BUFFER_MAX_SIZE = 2**31 - 1
+
+def _uniffi_check_buffer_size(size):
+    # ctypes silently truncates larger sizes to i32, which Rust then rejects with a panic
+    if size > _RUST_BUFFER_MAX_SIZE:
+        raise ValueError("value too large for a RustBuffer ({} bytes)".format(size))
+
+# Precompiled formats for the fixed-width primitives in the serialization format.
+_UNIFFI_STRUCT_I8 = struct.Struct(">b")
+_UNIFFI_STRUCT_U8 = struct.Struct(">B")
+_UNIFFI_STRUCT_I16 = struct.Struct(">h")
+_UNIFFI_STRUCT_U16 = struct.Struct(">H")
+_UNIFFI_STRUCT_I32 = struct.Struct(">i")
+_UNIFFI_STRUCT_U32 = struct.Struct(">I")
+_UNIFFI_STRUCT_I64 = struct.Struct(">q")
+_UNIFFI_STRUCT_U64 = struct.Struct(">Q")
+_UNIFFI_STRUCT_FLOAT = struct.Struct(">f")
+_UNIFFI_STRUCT_DOUBLE = struct.Struct(">d")
+_UNIFFI_STRUCT_CSIZET = struct.Struct("@N")
+
 
 class RustBufferStream:
     """
     Helper for structured reading of bytes from a RustBuffer
+
+    The buffer is mapped once as a memoryview over the Rust allocation.  Primitives are decoded
+    in place with `struct.Struct.unpack_from`, so only `read()` allocates.
     """
 
+    __slots__ = ("data", "len", "offset")
+
     def __init__(self, data, len):
+        # `data` is a memoryview (or any other buffer) over at least `len` bytes.
         self.data = data
         self.len = len
         self.offset = 0
 
     @classmethod
     def from_rust_buffer(cls, buf):
-        return cls(buf.data, buf.len)
+        return cls(buf.asMemoryview(), buf.len)
 
     def remaining(self):
         return self.len - self.offset
 
-    def _unpack_from(self, size, format):
-        if self.offset + size > self.len:
+    def _unpack_from(self, packer):
+        offset = self.offset
+        end = offset + packer.size
+        if end > self.len:
             raise InternalError("read past end of rust buffer")
-        value = struct.unpack(format, self.data[self.offset:self.offset+size])[0]
-        self.offset += size
+        value = packer.unpack_from(self.data, offset)[0]
+        self.offset = end
         return value
 
-    def read(self, size):
-        if self.offset + size > self.len:
+    def readView(self, size):
+        """
+        Read `size` bytes as a memoryview into the buffer, without copying them.
+
+        The view is only valid for as long as the underlying RustBuffer is alive.
+        """
+        offset = self.offset
+        end = offset + size
+        if end > self.len:
             raise InternalError("read past end of rust buffer")
-        data = self.data[self.offset:self.offset+size]
-        self.offset += size
-        return data
+        self.offset = end
+        return self.data[offset:end]
+
+    def read(self, size):
+        return self.readView(size).tobytes()
 
     def readI8(self):
-        return self._unpack_from(1, ">b")
+        return self._unpack_from(_UNIFFI_STRUCT_I8)
 
     def readU8(self):
-        return self._unpack_from(1, ">B")
+        return self._unpack_from(_UNIFFI_STRUCT_U8)
 
     def readI16(self):
-        return self._unpack_from(2, ">h")
+        return self._unpack_from(_UNIFFI_STRUCT_I16)
 
     def readU16(self):
-        return self._unpack_from(2, ">H")
+        return self._unpack_from(_UNIFFI_STRUCT_U16)
 
     def readI32(self):
-        return self._unpack_from(4, ">i")
+        return self._unpack_from(_UNIFFI_STRUCT_I32)
 
     def readU32(self):
-        return self._unpack_from(4, ">I")
+        return self._unpack_from(_UNIFFI_STRUCT_U32)
 
     def readI64(self):
-        return self._unpack_from(8, ">q")
+        return self._unpack_from(_UNIFFI_STRUCT_I64)
 
     def readU64(self):
-        return self._unpack_from(8, ">Q")
+        return self._unpack_from(_UNIFFI_STRUCT_U64)
 
     def readFloat(self):
-        v = self._unpack_from(4, ">f")
-        return v
+        return self._unpack_from(_UNIFFI_STRUCT_FLOAT)
 
     def readDouble(self):
-        return self._unpack_from(8, ">d")
+        return self._unpack_from(_UNIFFI_STRUCT_DOUBLE)
 
     def readCSizeT(self):
-        return self._unpack_from(ctypes.sizeof(ctypes.c_size_t) , "@N")
+        return self._unpack_from(_UNIFFI_STRUCT_CSIZET)
 
 class RustBufferBuilder:
     """
     Helper for structured writing of bytes into a RustBuffer.
+
+    Writes go straight into the Rust allocation through a writable view: blocks are copied
+    with a single memmove and primitives are encoded in place with precompiled `struct.Struct`
+    objects.  Capacity grows geometrically so a long run of small writes only needs a
+    logarithmic number of `rustbuffer_reserve` calls.
     """
 
-    def __init__(self):
-        self.rbuf = RustBuffer.alloc(16)
+    __slots__ = ("rbuf", "_view")
+
+    def __init__(self, capacity=16):
+        self.rbuf = RustBuffer.alloc(capacity)
         self.rbuf.len = 0
+        self._remap()
+
+    def _remap(self):
+        # (Re)create the view over the Rust allocation.  This must happen every time
+        # `RustBuffer.reserve` hands back a buffer, since the data may have moved.
+        self._view = self.rbuf.asMemoryview(self.rbuf.capacity)
 
     def finalize(self):
         rbuf = self.rbuf
         self.rbuf = None
+        self._view = None
         return rbuf
 
     def discard(self):
@@ -187,56 +463,72 @@ class RustBufferBuilder:
             rbuf = self.finalize()
             rbuf.free()
 
-    @contextlib.contextmanager
     def _reserve(self, numBytes):
-        if self.rbuf.len + numBytes > self.rbuf.capacity:
-            self.rbuf = RustBuffer.reserve(self.rbuf, numBytes)
-        yield None
-        self.rbuf.len += numBytes
-
-    def _pack_into(self, size, format, value):
-        with self._reserve(size):
-            # XXX TODO: I feel like I should be able to use `struct.pack_into` here but can't figure it out.
-            for i, byte in enumerate(struct.pack(format, value)):
-                self.rbuf.data[self.rbuf.len + i] = byte
+        rbuf = self.rbuf
+        if rbuf.len + numBytes > rbuf.capacity:
+            _uniffi_check_buffer_size(rbuf.len + numBytes)
+            # Grow by at least the current capacity, without going past what the i32 fields can hold.
+            additional = max(numBytes, min(rbuf.capacity, _RUST_BUFFER_MAX_SIZE - rbuf.len))
+            self._view.release()
+            self.rbuf = RustBuffer.reserve(rbuf, additional)
+            self._remap()
+
+    def _pack_into(self, packer, value):
+        size = packer.size
+        self._reserve(size)
+        packer.pack_into(self._view, self.rbuf.len, value)
+        self.rbuf.len += size
 
     def write(self, value):
-        with self._reserve(len(value)):
-            for i, byte in enumerate(value):
-                self.rbuf.data[self.rbuf.len + i] = byte
+        if type(value) is bytes:
+            size = len(value)
+            self._reserve(size)
+            ctypes.memmove(ctypes.cast(self.rbuf.data, ctypes.c_void_p).value + self.rbuf.len, value, size)
+        else:
+            value = memoryview(value).cast("B")
+            size = value.nbytes
+            self._reserve(size)
+            offset = self.rbuf.len
+            self._view[offset:offset + size] = value
+        self.rbuf.len += size
+
+    def patchI32(self, offset, v):
+        # Overwrite an already written i32, for counts that are only known at the end
+        _UNIFFI_STRUCT_I32.pack_into(self._view, offset, v)
 
     def writeI8(self, v):
-        self._pack_into(1, ">b", v)
+        self._pack_into(_UNIFFI_STRUCT_I8, v)
 
     def writeU8(self, v):
-        self._pack_into(1, ">B", v)
+        self._pack_into(_UNIFFI_STRUCT_U8, v)
 
     def writeI16(self, v):
-        self._pack_into(2, ">h", v)
+        self._pack_into(_UNIFFI_STRUCT_I16, v)
 
     def writeU16(self, v):
-        self._pack_into(2, ">H", v)
+        self._pack_into(_UNIFFI_STRUCT_U16, v)
 
     def writeI32(self, v):
-        self._pack_into(4, ">i", v)
+        self._pack_into(_UNIFFI_STRUCT_I32, v)
 
     def writeU32(self, v):
-        self._pack_into(4, ">I", v)
+        self._pack_into(_UNIFFI_STRUCT_U32, v)
 
     def writeI64(self, v):
-        self._pack_into(8, ">q", v)
+        self._pack_into(_UNIFFI_STRUCT_I64, v)
 
     def writeU64(self, v):
-        self._pack_into(8, ">Q", v)
+        self._pack_into(_UNIFFI_STRUCT_U64, v)
 
     def writeFloat(self, v):
-        self._pack_into(4, ">f", v)
+        self._pack_into(_UNIFFI_STRUCT_FLOAT, v)
 
     def writeDouble(self, v):
-        self._pack_into(8, ">d", v)
+        self._pack_into(_UNIFFI_STRUCT_DOUBLE, v)
 
     def writeCSizeT(self, v):
-        self._pack_into(ctypes.sizeof(ctypes.c_size_t) , "@N", v)
+        self._pack_into(_UNIFFI_STRUCT_CSIZET, v)
+
 # A handful of classes and functions to support the generated data structures.
 # This would be a good candidate for isolating in its own ffi-support lib.
 
@@ -276,6 +568,8 @@ def rust_call_with_error(error_ffi_converter, fn, *args):
     #
     # This function is used for rust calls that return Result<> and therefore can set the CALL_ERROR status code.
     # error_ffi_converter must be set to the FfiConverter for the error class that corresponds to the result.
+    if _uniffi_instrumentation is not None:
+        return _uniffi_instrumentation.rust_call(fn.__name__, fn, error_ffi_converter, args)
     call_status = RustCallStatus(code=RustCallStatus.CALL_SUCCESS, error_buf=RustBuffer(0, 0, None))
 
     args_with_error = args + (ctypes.byref(call_status),)
@@ -286,6 +580,7 @@ def rust_call_with_error(error_ffi_converter, fn, *args):
 def rust_call_async(scaffolding_fn, callback_fn, *args):
     # Call the scaffolding function, passing it a callback handler for `AsyncTypes.py` and a pointer
     # to a python Future object.  The async function then awaits the Future.
+    import asyncio
     uniffi_eventloop = asyncio.get_running_loop()
     uniffi_py_future = uniffi_eventloop.create_future()
     uniffi_call_status = RustCallStatus(code=RustCallStatus.CALL_SUCCESS, error_buf=RustBuffer(0, 0, None))
@@ -302,6 +597,38 @@ def rust_call_async(scaffolding_fn, callback_fn, *args):
     uniffi_check_call_status(None, uniffi_call_status)
     return uniffi_py_future
 
+# Per-thread state for the prebound call stubs
+_uniffi_thread_local = threading.local()
+
+def _uniffi_call_status():
+    # Get this thread's reusable RustCallStatus, along with a cached `byref()` to it
+    try:
+        return _uniffi_thread_local.call_status
+    except AttributeError:
+        call_status = RustCallStatus(code=RustCallStatus.CALL_SUCCESS, error_buf=RustBuffer(0, 0, None))
+        _uniffi_thread_local.call_status = (call_status, ctypes.byref(call_status))
+        return _uniffi_thread_local.call_status
+
+def _uniffi_swap_call_status(saved):
+    # Callbacks from Rust run in the middle of an FFI call, which may be using this thread's
+    # RustCallStatus.  They take it out of the way with `saved = _uniffi_swap_call_status(None)`
+    # so that calls made from the callback get their own, and put it back with
+    # `_uniffi_swap_call_status(saved)` when they return.
+    previous = getattr(_uniffi_thread_local, "call_status", None)
+    if saved is None:
+        _uniffi_thread_local.__dict__.pop("call_status", None)
+    else:
+        _uniffi_thread_local.call_status = saved
+    return previous
+
+def _uniffi_check_reused_call_status(error_ffi_converter, call_status):
+    # Error path of the prebound stubs.  Hand a copy to `uniffi_check_call_status` and reset the
+    # thread's status first, so that it's clean for the next call even if this one raises.
+    status_copy = RustCallStatus.from_buffer_copy(call_status)
+    call_status.code = RustCallStatus.CALL_SUCCESS
+    call_status.error_buf = RustBuffer(0, 0, None)
+    uniffi_check_call_status(error_ffi_converter, status_copy)
+
 def uniffi_check_call_status(error_ffi_converter, call_status):
     if call_status.code == RustCallStatus.CALL_SUCCESS:
         pass
@@ -359,6 +686,18 @@ class UniFfiPointerManagerCPython:
     def lookup(self, address):
         return ctypes.cast(address, ctypes.py_object).value
 
+class _UniFfiHandleShard:
+    __slots__ = ("lock", "objects", "free")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Slot `i` holds the object for handle `((i + 1) << SHARD_BITS) | shard`, or
+        # `_UNIFFI_FREE_SLOT` if it's on the free list.
+        self.objects = []
+        self.free = []
+
+_UNIFFI_FREE_SLOT = object()
+
 class UniFfiPointerManagerGeneral:
     """
     Manage giving out pointers to Python objects on non-CPython platforms
@@ -368,30 +707,72 @@ class UniFfiPointerManagerGeneral:
 
     Instead of using real pointers, it maps integer values to objects and returns the keys as
     c_size_t values.
+
+    The table is split into `2**SHARD_BITS` shards, each with its own lock, and the low bits of a
+    handle select the shard.  Each thread allocates from its own shard, so threads creating and
+    releasing handles rarely contend.  `lookup()` doesn't take a lock at all: it is a single
+    list index.  Released slots are reused, so handles stay small; like with real pointers,
+    using a handle after releasing it is a bug.  Handles are never 0.
     """
 
+    SHARD_BITS = 4
+
     def __init__(self):
-        self._map = {}
-        self._lock = threading.Lock()
-        self._current_handle = 0
+        self._mask = (1 << self.SHARD_BITS) - 1
+        self._shards = [_UniFfiHandleShard() for _ in range(self._mask + 1)]
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+
+    def _home_shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            index = self._local.shard = next(self._next_shard) & self._mask
+            return index
 
     def new_pointer(self, obj):
-        with self._lock:
-            handle = self._current_handle
-            self._current_handle += 1
-            self._map[handle] = obj
-        return handle
+        index = self._home_shard()
+        shard = self._shards[index]
+        with shard.lock:
+            if shard.free:
+                slot = shard.free.pop()
+                shard.objects[slot] = obj
+            else:
+                slot = len(shard.objects)
+                shard.objects.append(obj)
+        return ((slot + 1) << self.SHARD_BITS) | index
 
     def release_pointer(self, handle):
-        with self._lock:
-            return self._map.pop(handle)
+        shard = self._shards[handle & self._mask]
+        slot = (handle >> self.SHARD_BITS) - 1
+        with shard.lock:
+            obj = shard.objects[slot] if 0 <= slot < len(shard.objects) else _UNIFFI_FREE_SLOT
+            if obj is _UNIFFI_FREE_SLOT:
+                raise KeyError(handle)
+            shard.objects[slot] = _UNIFFI_FREE_SLOT
+            shard.free.append(slot)
+        return obj
 
     def lookup(self, handle):
-        with self._lock:
-            return self._map[handle]
+        slot = (handle >> self.SHARD_BITS) - 1
+        objects = self._shards[handle & self._mask].objects
+        obj = objects[slot] if 0 <= slot < len(objects) else _UNIFFI_FREE_SLOT
+        if obj is _UNIFFI_FREE_SLOT:
+            raise KeyError(handle)
+        return obj
+
+    def live_count(self):
+        """
+        Number of handles that have been given out and not released yet.
+        """
+        count = 0
+        for shard in self._shards:
+            with shard.lock:
+                count += len(shard.objects) - len(shard.free)
+        return count
 
 # Pick an pointer manager implementation based on the platform
-if platform.python_implementation() == 'CPython':
+if sys.implementation.name == "cpython":
     UniFfiPointerManager = UniFfiPointerManagerCPython  # type: ignore
 else:
     UniFfiPointerManager = UniFfiPointerManagerGeneral  # type: ignore
@@ -442,7 +823,9 @@ class FfiConverterPrimitiveFloat(FfiConverterPrimitive):
         return super().check(value)
 
 # Helper class for wrapper types that will always go through a RustBuffer.
-# Classes should inherit from this and implement the `read` and `write` static methods.
+# Classes should inherit from this and implement the `read`, `write` and `encodedSize` static
+# methods.  `encodedSize(value)` is the number of bytes `write(value)` produces, which lets
+# `lower` allocate the RustBuffer once, at its final size.
 class FfiConverterRustBuffer:
     @classmethod
     def lift(cls, rbuf):
@@ -451,7 +834,7 @@ class FfiConverterRustBuffer:
 
     @classmethod
     def lower(cls, value):
-        with RustBuffer.allocWithBuilder() as builder:
+        with RustBuffer.allocWithBuilder(cls.encodedSize(value)) as builder:
             cls.write(value, builder)
             return builder.finalize()
 
@@ -486,13 +869,134 @@ def uniffi_future_callback_t(return_type):
     """
     return ctypes.CFUNCTYPE(None, ctypes.c_size_t, return_type, RustCallStatus)
 
-from pathlib import Path
+# Pointers to the python Futures of pending async calls, see `rust_call_async`
+UniFfiPyFuturePointerManager = UniFfiPointerManager()
+
+class FfiConverterForeignExecutor:
+    """
+    Lowers an asyncio event loop to the opaque handle Rust uses to schedule tasks on it.
+    """
+
+    _pointer_manager = UniFfiPointerManager()
+
+    @classmethod
+    def lift(cls, value):
+        return cls._pointer_manager.lookup(value)
+
+    @classmethod
+    def lower(cls, value):
+        import asyncio
+        if not isinstance(value, asyncio.AbstractEventLoop):
+            raise TypeError("ForeignExecutor must be an asyncio event loop, not {}".format(type(value).__name__))
+        return cls._pointer_manager.new_pointer(value)
+
+    @classmethod
+    def read(cls, buf):
+        return cls.lift(buf.readCSizeT())
+
+    @classmethod
+    def write(cls, value, buf):
+        buf.writeCSizeT(cls.lower(value))
+
+@UNIFFI_FOREIGN_EXECUTOR_CALLBACK_T
+def uniffi_foreign_executor_callback(eventloop_address, delay, task_ptr, task_data):
+    saved = _uniffi_swap_call_status(None)
+    try:
+        if task_ptr is None:
+            # Rust dropped the ForeignExecutor, release our reference to the event loop
+            FfiConverterForeignExecutor._pointer_manager.release_pointer(eventloop_address)
+            return
+        eventloop = FfiConverterForeignExecutor._pointer_manager.lookup(eventloop_address)
+        task = UNIFFI_RUST_TASK(task_ptr)
+        # This is usually called from a Rust thread, so everything has to go through call_soon_threadsafe
+        if delay == 0:
+            eventloop.call_soon_threadsafe(task, task_data)
+        else:
+            eventloop.call_soon_threadsafe(eventloop.call_later, delay / 1000.0, task, task_data)
+    finally:
+        _uniffi_swap_call_status(saved)
+
+class _UniFfiQueuedCallback(ctypes.Structure):
+    """
+    A call of the foreign executor callback, queued by Rust (see src/ffi.rs)
+    """
+    _fields_ = [
+        ("executor", ctypes.c_size_t),
+        ("delay", ctypes.c_uint32),
+        ("task", ctypes.c_void_p),
+        ("task_data", ctypes.c_void_p),
+    ]
+
+def uniffi_future_callback(return_type, lift_func, error_ffi_converter=None):
+    """
+    Create the callback that completes the python Future of an async call, given the FFI
+    return type, the function to lift the result with and the error converter.
+
+    The returned function pointer must be kept alive for as long as calls may use it.
+    """
+    def resolve(future, result, call_status):
+        if future.cancelled():
+            return
+        try:
+            uniffi_check_call_status(error_ffi_converter, call_status)
+            future.set_result(lift_func(result))
+        except BaseException as e:
+            future.set_exception(e)
+
+    @uniffi_future_callback_t(return_type)
+    def callback(future_ptr, result, call_status):
+        saved = _uniffi_swap_call_status(None)
+        try:
+            future = UniFfiPyFuturePointerManager.release_pointer(future_ptr)
+            # `call_status` only lives for the duration of the callback
+            call_status = RustCallStatus.from_buffer_copy(call_status)
+            future.get_loop().call_soon_threadsafe(resolve, future, result, call_status)
+        finally:
+            _uniffi_swap_call_status(saved)
+
+    return callback
+
+# Where the `*_async` wrappers of blocking functions run their FFI calls.  None means the
+# running loop's default executor.
+_uniffi_blocking_executor = None
+_uniffi_blocking_executor_owned = False
+
+def uniffi_set_blocking_executor(executor=None, *, max_workers=None):
+    """
+    Choose the executor that the `*_async` functions run their blocking FFI calls on.
+
+    Pass a `concurrent.futures.Executor`, or only `max_workers` to create a dedicated
+    ThreadPoolExecutor.  With neither, calls go to the running loop's default executor.  A
+    dedicated pool created here is shut down when it's replaced.  Returns the new executor.
+    """
+    global _uniffi_blocking_executor, _uniffi_blocking_executor_owned
+    if executor is None and max_workers is not None:
+        import concurrent.futures
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="uniffi-blocking")
+        owned = True
+    else:
+        owned = False
+    previous, previous_owned = _uniffi_blocking_executor, _uniffi_blocking_executor_owned
+    _uniffi_blocking_executor, _uniffi_blocking_executor_owned = executor, owned
+    if previous_owned:
+        previous.shutdown(wait=False)
+    return executor
+
+def _uniffi_run_blocking(func, *args):
+    import asyncio
+    return asyncio.get_running_loop().run_in_executor(_uniffi_blocking_executor, func, *args)
 
 def loadIndirect():
     """
     This is how we find and load the dynamic library provided by the component.
-    For now we just look it up by name.
+
+    `UNIFFI_CUSTOM_BUG_LIBRARY_PATH` can point to the library, otherwise we look it up by name
+    next to this file.
     """
+    path = os.environ.get("UNIFFI_CUSTOM_BUG_LIBRARY_PATH")
+    if path:
+        return ctypes.cdll.LoadLibrary(path)
+
     if sys.platform == "darwin":
         libname = "lib{}.dylib"
     elif sys.platform.startswith("win"):
@@ -509,7 +1013,7 @@ def loadIndirect():
         libname = "lib{}.so"
 
     libname = libname.format("uniffi_custom_bug")
-    path = str(Path(__file__).parent / libname)
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), libname)
     lib = ctypes.cdll.LoadLibrary(path)
     return lib
 
@@ -525,44 +1029,370 @@ def uniffi_check_api_checksums(lib):
     if lib.uniffi_uniffi_custom_bug_checksum_func_test_fn() != 13503:
         raise InternalError("UniFFI API checksum mismatch: try cleaning and rebuilding your project")
 
+def _uniffi_verified_libraries_path():
+    # The cache is opt-in: importing the bindings shouldn't write to the user's home directory
+    cache_dir = os.environ.get("UNIFFI_CUSTOM_BUG_CACHE_DIR")
+    return os.path.join(cache_dir, "verified") if cache_dir else None
+
+def uniffi_check_library(lib):
+    """
+    Run the contract version and API checksum checks, unless they already passed for this
+    exact dylib.
+
+    With UNIFFI_CUSTOM_BUG_CACHE_DIR set, successful checks are remembered in a small cache
+    file in that directory, keyed by the inode, mtime and size of both the dylib and this file,
+    so rebuilding or regenerating either invalidates them.  Reading the cache costs more than
+    the checks of a library with only a few functions, like this one: it only pays off for
+    libraries with many checksums.
+    """
+    path = _uniffi_verified_libraries_path()
+    try:
+        lib_stat = os.stat(lib._name)
+        own_stat = os.stat(__file__)
+    except (OSError, TypeError):
+        path = None
+    verified = []
+    if path is not None:
+        key = "{}:{}:{}:{} {}:{}:{}:{}\n".format(
+            lib_stat.st_dev, lib_stat.st_ino, lib_stat.st_mtime_ns, lib_stat.st_size,
+            own_stat.st_dev, own_stat.st_ino, own_stat.st_mtime_ns, own_stat.st_size,
+        )
+        try:
+            with open(path) as f:
+                verified = f.readlines()
+        except OSError:
+            pass
+        if key in verified:
+            return
+
+    uniffi_check_contract_api_version(lib)
+    uniffi_check_api_checksums(lib)
+
+    if path is not None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = "{}.{}".format(path, os.getpid())
+            with open(tmp_path, "w") as f:
+                # Only keep the most recent builds around
+                f.writelines(verified[-31:] + [key])
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+# Signatures of the FFI functions, as `symbol: (argtypes, restype)`.  `_uniffi_load_library`
+# declares all of them, and `_uniffi_bind_stubs` binds each to a `_uniffi_fn_<name>` global for
+# the prebound call stubs (see `_uniffi_stub_global`).
+_UNIFFI_FFI_FUNCTIONS = {
+    "uniffi_uniffi_custom_bug_fn_func_test_fn": (
+        (
+            RustBuffer,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    # Hand-written exports (see src/ffi.rs), so there are no checksums for them
+    "uniffi_uniffi_custom_bug_fn_func_test_fn_many": (
+        (
+            RustBuffer,
+            ctypes.POINTER(ctypes.c_int32),
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    "uniffi_uniffi_custom_bug_fn_func_test_fn_borrowed": (
+        (
+            ForeignBytes,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    "uniffi_uniffi_custom_bug_fn_func_test_fn_stream_open": (
+        (
+            ctypes.POINTER(RustCallStatus),
+        ),
+        ctypes.c_uint64,
+    ),
+    "uniffi_uniffi_custom_bug_fn_func_test_fn_stream_push": (
+        (
+            ctypes.c_uint64,
+            ForeignBytes,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    "uniffi_uniffi_custom_bug_fn_func_test_fn_stream_finish": (
+        (
+            ctypes.c_uint64,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    "uniffi_uniffi_custom_bug_fn_func_test_fn_stream_abort": (
+        (
+            ctypes.c_uint64,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    "ffi_UniffiCustomBug_callback_queue_drain": (
+        (
+            ctypes.POINTER(_UniFfiQueuedCallback),
+            ctypes.c_int32,
+            ctypes.c_uint32,
+            ctypes.c_uint32,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        ctypes.c_int32,
+    ),
+    "ffi_UniffiCustomBug_callback_queue_set_closed": (
+        (
+            ctypes.c_int8,
+            UNIFFI_FOREIGN_EXECUTOR_CALLBACK_T,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    "ffi_UniffiCustomBug_callback_queue_reset": (
+        (
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    "uniffi_foreign_executor_callback_set": (
+        (
+            UNIFFI_FOREIGN_EXECUTOR_CALLBACK_T,
+        ),
+        None,
+    ),
+    "ffi_UniffiCustomBug_rustbuffer_alloc": (
+        (
+            ctypes.c_int32,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        RustBuffer,
+    ),
+    "ffi_UniffiCustomBug_rustbuffer_from_bytes": (
+        (
+            ForeignBytes,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        RustBuffer,
+    ),
+    "ffi_UniffiCustomBug_rustbuffer_free": (
+        (
+            RustBuffer,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    "ffi_UniffiCustomBug_rustbuffer_reserve": (
+        (
+            RustBuffer,
+            ctypes.c_int32,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        RustBuffer,
+    ),
+    "ffi_UniffiCustomBug_rustbuffer_alloc_many": (
+        (
+            ctypes.c_int32,
+            ctypes.c_int32,
+            ctypes.POINTER(RustBuffer),
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    "ffi_UniffiCustomBug_rustbuffer_free_many": (
+        (
+            ctypes.POINTER(RustBuffer),
+            ctypes.c_int32,
+            ctypes.POINTER(RustCallStatus),
+        ),
+        None,
+    ),
+    "uniffi_uniffi_custom_bug_checksum_func_test_fn": (
+        (
+        ),
+        ctypes.c_uint16,
+    ),
+    "ffi_UniffiCustomBug_uniffi_contract_version": (
+        (
+        ),
+        ctypes.c_uint32,
+    ),
+}
+
+def _uniffi_load_library():
+    lib = loadIndirect()
+    for symbol, (argtypes, restype) in _UNIFFI_FFI_FUNCTIONS.items():
+        function = getattr(lib, symbol)
+        function.argtypes = argtypes
+        function.restype = restype
+    uniffi_check_library(lib)
+    # Rust calls this to schedule the tasks of async calls on their event loop.  It's a module
+    # global, so the function pointer stays alive for as long as the library does.
+    lib.uniffi_foreign_executor_callback_set(uniffi_foreign_executor_callback)
+    return lib
+
+# Prebound call stubs for the FFI functions on the hot paths.
+#
+# Each stub does the same as `rust_call_with_error` for its function, but without the generic
+# machinery: the function pointer is looked up once, the thread's RustCallStatus is reused and
+# passed through a cached `byref()`, and the success check is inlined.  The error path is
+# unchanged, and so is the instrumented path when UniFfiInstrumentation is enabled.  Every
+# function in `_UNIFFI_FFI_FUNCTIONS` gets its `_uniffi_fn_<name>` global, so a new function
+# only needs its signature there before a stub can call it.
+
+# Symbol prefixes, and what replaces them in the names of the `_uniffi_fn_*` globals
+_UNIFFI_SYMBOL_PREFIXES = (
+    ("uniffi_uniffi_custom_bug_fn_func_", ""),
+    ("uniffi_uniffi_custom_bug_checksum_func_", "checksum_"),
+    ("ffi_UniffiCustomBug_", ""),
+    ("uniffi_", ""),
+)
+
+def _uniffi_stub_global(symbol):
+    # The global holding the function pointer of `symbol`, e.g. `_uniffi_fn_test_fn` for
+    # `uniffi_uniffi_custom_bug_fn_func_test_fn`
+    for prefix, replacement in _UNIFFI_SYMBOL_PREFIXES:
+        if symbol.startswith(prefix):
+            return "_uniffi_fn_" + replacement + symbol[len(prefix):]
+    return "_uniffi_fn_" + symbol
+
+def _uniffi_call_test_fn_stream_push(session, chunk):
+    if _uniffi_instrumentation is not None:
+        return _uniffi_instrumentation.rust_call("test_fn_stream_push", _uniffi_fn_test_fn_stream_push, None, (session, chunk))
+    call_status, call_status_ref = _uniffi_call_status()
+    _uniffi_fn_test_fn_stream_push(session, chunk, call_status_ref)
+    if call_status.code:
+        _uniffi_check_reused_call_status(None, call_status)
+
+def _uniffi_call_rustbuffer_alloc(size):
+    if _uniffi_instrumentation is not None:
+        return _uniffi_instrumentation.rust_call("ffi_UniffiCustomBug_rustbuffer_alloc", _uniffi_fn_rustbuffer_alloc, None, (size,))
+    call_status, call_status_ref = _uniffi_call_status()
+    result = _uniffi_fn_rustbuffer_alloc(size, call_status_ref)
+    if call_status.code:
+        _uniffi_check_reused_call_status(None, call_status)
+    return result
+
+def _uniffi_call_rustbuffer_reserve(rbuf, additional):
+    if _uniffi_instrumentation is not None:
+        return _uniffi_instrumentation.rust_call("ffi_UniffiCustomBug_rustbuffer_reserve", _uniffi_fn_rustbuffer_reserve, None, (rbuf, additional))
+    call_status, call_status_ref = _uniffi_call_status()
+    result = _uniffi_fn_rustbuffer_reserve(rbuf, additional, call_status_ref)
+    if call_status.code:
+        _uniffi_check_reused_call_status(None, call_status)
+    return result
+
+def _uniffi_call_rustbuffer_free(rbuf):
+    if _uniffi_instrumentation is not None:
+        return _uniffi_instrumentation.rust_call("ffi_UniffiCustomBug_rustbuffer_free", _uniffi_fn_rustbuffer_free, None, (rbuf,))
+    call_status, call_status_ref = _uniffi_call_status()
+    _uniffi_fn_rustbuffer_free(rbuf, call_status_ref)
+    if call_status.code:
+        _uniffi_check_reused_call_status(None, call_status)
+
+def _uniffi_call_test_fn(type_param):
+    if _uniffi_buffer_tracker is not None:
+        # Rust takes ownership of the buffer
+        _uniffi_buffer_tracker.untrack(type_param)
+    if _uniffi_instrumentation is not None:
+        return _uniffi_instrumentation.rust_call("test_fn", _uniffi_fn_test_fn, None, (type_param,))
+    call_status, call_status_ref = _uniffi_call_status()
+    _uniffi_fn_test_fn(type_param, call_status_ref)
+    if call_status.code:
+        _uniffi_check_reused_call_status(None, call_status)
+
+def _uniffi_call_test_fn_borrowed(type_param):
+    if _uniffi_instrumentation is not None:
+        return _uniffi_instrumentation.rust_call("test_fn_borrowed", _uniffi_fn_test_fn_borrowed, None, (type_param,))
+    call_status, call_status_ref = _uniffi_call_status()
+    _uniffi_fn_test_fn_borrowed(type_param, call_status_ref)
+    if call_status.code:
+        _uniffi_check_reused_call_status(None, call_status)
+
+def _uniffi_call_test_fn_many(type_params, processed=None):
+    # `processed` is a c_int32 that receives the number of values Rust processed
+    if processed is None:
+        processed = ctypes.c_int32()
+    if _uniffi_buffer_tracker is not None:
+        # Rust takes ownership of the buffer
+        _uniffi_buffer_tracker.untrack(type_params)
+    if _uniffi_instrumentation is not None:
+        return _uniffi_instrumentation.rust_call("test_fn_many", _uniffi_fn_test_fn_many, None, (type_params, ctypes.byref(processed)))
+    call_status, call_status_ref = _uniffi_call_status()
+    _uniffi_fn_test_fn_many(type_params, ctypes.byref(processed), call_status_ref)
+    if call_status.code:
+        _uniffi_check_reused_call_status(None, call_status)
+
+def _uniffi_bind_stubs(lib):
+    for symbol in _UNIFFI_FFI_FUNCTIONS:
+        globals()[_uniffi_stub_global(symbol)] = getattr(lib, symbol)
+
 # A ctypes library to expose the extern-C FFI definitions.
 # This is an implementation detail which will be called internally by the public API.
+#
+# With UNIFFI_CUSTOM_BUG_LAZY_LOAD=1 this starts out as a placeholder, and the dylib is only
+# loaded, bound and verified the first time an FFI function is needed.
+
+class _UniFFILazyLib:
+    def __getattr__(self, name):
+        return getattr(_uniffi_ensure_library(), name)
+
+_uniffi_library_lock = threading.Lock()
+
+def _uniffi_ensure_library():
+    global _UniFFILib
+    with _uniffi_library_lock:
+        if isinstance(_UniFFILib, _UniFFILazyLib):
+            lib = _uniffi_load_library()
+            _uniffi_bind_stubs(lib)
+            _UniFFILib = lib
+    return _UniFFILib
+
+def _uniffi_lazy_function(symbol):
+    def load_and_call(*args):
+        return getattr(_uniffi_ensure_library(), symbol)(*args)
+    return load_and_call
+
+if os.environ.get("UNIFFI_CUSTOM_BUG_LAZY_LOAD", "0") != "0":
+    _UniFFILib = _UniFFILazyLib()
+    for _uniffi_symbol in _UNIFFI_FFI_FUNCTIONS:
+        globals()[_uniffi_stub_global(_uniffi_symbol)] = _uniffi_lazy_function(_uniffi_symbol)
+else:
+    _UniFFILib = _uniffi_load_library()
+    _uniffi_bind_stubs(_UniFFILib)
 
-_UniFFILib = loadIndirect()
-_UniFFILib.uniffi_uniffi_custom_bug_fn_func_test_fn.argtypes = (
-    RustBuffer,
-    ctypes.POINTER(RustCallStatus),
-)
-_UniFFILib.uniffi_uniffi_custom_bug_fn_func_test_fn.restype = None
-_UniFFILib.ffi_UniffiCustomBug_rustbuffer_alloc.argtypes = (
-    ctypes.c_int32,
-    ctypes.POINTER(RustCallStatus),
-)
-_UniFFILib.ffi_UniffiCustomBug_rustbuffer_alloc.restype = RustBuffer
-_UniFFILib.ffi_UniffiCustomBug_rustbuffer_from_bytes.argtypes = (
-    ForeignBytes,
-    ctypes.POINTER(RustCallStatus),
-)
-_UniFFILib.ffi_UniffiCustomBug_rustbuffer_from_bytes.restype = RustBuffer
-_UniFFILib.ffi_UniffiCustomBug_rustbuffer_free.argtypes = (
-    RustBuffer,
-    ctypes.POINTER(RustCallStatus),
-)
-_UniFFILib.ffi_UniffiCustomBug_rustbuffer_free.restype = None
-_UniFFILib.ffi_UniffiCustomBug_rustbuffer_reserve.argtypes = (
-    RustBuffer,
-    ctypes.c_int32,
-    ctypes.POINTER(RustCallStatus),
-)
-_UniFFILib.ffi_UniffiCustomBug_rustbuffer_reserve.restype = RustBuffer
-_UniFFILib.uniffi_uniffi_custom_bug_checksum_func_test_fn.argtypes = (
-)
-_UniFFILib.uniffi_uniffi_custom_bug_checksum_func_test_fn.restype = ctypes.c_uint16
-_UniFFILib.ffi_UniffiCustomBug_uniffi_contract_version.argtypes = (
-)
-_UniFFILib.ffi_UniffiCustomBug_uniffi_contract_version.restype = ctypes.c_uint32
-uniffi_check_contract_api_version(_UniFFILib)
-uniffi_check_api_checksums(_UniFFILib)
+def uniffi_preload():
+    """
+    Load and verify the library now, e.g. in the master process of a prefork server.
+
+    Forked workers then share the loaded library and the bound functions copy-on-write instead
+    of each loading and verifying it again (with UNIFFI_CUSTOM_BUG_LAZY_LOAD, that would
+    otherwise happen on the first call in every worker).
+    """
+    return _uniffi_ensure_library()
+
+def _uniffi_after_fork_in_child():
+    # Only the forking thread survives a fork, and any lock may have been held by another
+    # thread at the time.  Give the child fresh per-process state: thread-locals, locks, handle
+    # tables (the parent's futures and event loops aren't the child's), executors.
+    global _uniffi_thread_local, _uniffi_library_lock, UniFfiPyFuturePointerManager
+    global _uniffi_blocking_executor, _uniffi_blocking_executor_owned, _uniffi_worker_segments
+    _uniffi_thread_local = threading.local()
+    _uniffi_library_lock = threading.Lock()
+    UniFfiPyFuturePointerManager = UniFfiPointerManager()
+    FfiConverterForeignExecutor._pointer_manager = UniFfiPointerManager()
+    _uniffi_blocking_executor = None
+    _uniffi_blocking_executor_owned = False
+    _uniffi_worker_segments = collections.OrderedDict()
+    for state in (_uniffi_rustbuffer_pool, _uniffi_lift_cache, _uniffi_lower_cache, _uniffi_buffer_tracker, _uniffi_instrumentation, _uniffi_batched_callbacks, _uniffi_async_batcher):
+        if state is not None:
+            state._after_fork()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_uniffi_after_fork_in_child)
 
 # Public interface members begin here.
 
@@ -579,8 +1409,9 @@ class FfiConverterString:
         size = buf.readI32()
         if size < 0:
             raise InternalError("Unexpected negative string length")
-        utf8Bytes = buf.read(size)
-        return utf8Bytes.decode("utf-8")
+        if _uniffi_lift_cache is not None:
+            return _uniffi_lift_cache.liftString(buf.readView(size))
+        return str(buf.readView(size), "utf-8")
 
     @staticmethod
     def write(value, buf):
@@ -592,13 +1423,29 @@ class FfiConverterString:
     @staticmethod
     def lift(buf):
         with buf.consumeWithStream() as stream:
-            return stream.read(stream.remaining()).decode("utf-8")
+            if _uniffi_lift_cache is not None:
+                return _uniffi_lift_cache.liftString(stream.readView(stream.remaining()))
+            return str(stream.readView(stream.remaining()), "utf-8")
+
+    @staticmethod
+    def liftView(buf):
+        """
+        Lift the UTF-8 encoded string without copying it out of the RustBuffer.
+
+        Call `decode()` on the returned RustBufferView to get a `str`.
+        """
+        return RustBufferView(buf, 0, buf.len)
+
+    @staticmethod
+    def encodedSize(value):
+        return 4 + len(FfiConverterString.check(value).encode("utf-8"))
 
     @staticmethod
     def lower(value):
         value = FfiConverterString.check(value)
-        with RustBuffer.allocWithBuilder() as builder:
-            builder.write(value.encode("utf-8"))
+        utf8Bytes = value.encode("utf-8")
+        with RustBuffer.allocWithBuilder(len(utf8Bytes)) as builder:
+            builder.write(utf8Bytes)
             return builder.finalize()
 
 class FfiConverterBytes(FfiConverterRustBuffer):
@@ -607,22 +1454,299 @@ class FfiConverterBytes(FfiConverterRustBuffer):
         size = buf.readI32()
         if size < 0:
             raise InternalError("Unexpected negative byte string length")
+        if _uniffi_lift_cache is not None:
+            return _uniffi_lift_cache.liftBytes(buf.readView(size))
         return buf.read(size)
 
+    @staticmethod
+    def liftView(rbuf):
+        """
+        Lift the byte string as a RustBufferView instead of copying it into a `bytes` object.
+        """
+        try:
+            with rbuf.readWithStream() as stream:
+                size = stream.readI32()
+                if size < 0:
+                    raise InternalError("Unexpected negative byte string length")
+                stream.readView(size)
+        except:
+            rbuf.free()
+            raise
+        return RustBufferView(rbuf, 4, size)
+
+    @staticmethod
+    def iterChunks(rbuf, chunk_size=1 << 20):
+        """
+        Iterate over the byte string in `rbuf` in `bytes` chunks of at most `chunk_size` bytes.
+
+        `rbuf` already holds the whole value, so this doesn't reduce what Rust allocates; it
+        avoids also copying the whole value into a `bytes` object, e.g. when it is written to a
+        file.  The buffer is freed once the iterator is exhausted, closed or garbage collected.
+        """
+        return RustBufferChunks(rbuf, chunk_size)
+
+    @staticmethod
+    def encodedSize(value):
+        try:
+            return 4 + memoryview(value).nbytes
+        except TypeError:
+            raise TypeError("a bytes-like object is required, not {!r}".format(type(value).__name__))
+
     @staticmethod
     def write(value, buf):
         try:
-            memoryview(value)
+            view = memoryview(value)
         except TypeError:
             raise TypeError("a bytes-like object is required, not {!r}".format(type(value).__name__))
-        buf.writeI32(len(value))
-        buf.write(value)
+        # The length is in bytes, which isn't `len()` for e.g. an `array.array("I")`
+        _uniffi_check_buffer_size(buf.rbuf.len + 4 + view.nbytes)
+        buf.writeI32(view.nbytes)
+        buf.write(view)
+
+# The serialization format is big-endian, `array.array` uses the host byte order.
+_UNIFFI_ARRAY_BYTESWAP = sys.byteorder == "little"
+
+def _uniffi_buffer_format(value):
+    # The struct format of a contiguous buffer, or None if it isn't one
+    view = memoryview(value)
+    if not view.c_contiguous:
+        return None
+    return view.format
+
+def _uniffi_array_typecode(candidates, itemsize):
+    for typecode in candidates:
+        if array.array(typecode).itemsize == itemsize:
+            return typecode
+    raise InternalError("No array typecode with itemsize {} among {!r}".format(itemsize, candidates))
+
+class FfiConverterSequenceFixedWidth(FfiConverterRustBuffer):
+    """
+    Sequences of fixed-width primitives.
+
+    The elements are decoded and encoded as whole runs with `array.array` (plus a byteswap on
+    little-endian hosts), so there is no per-element Python code on either side.  `read` returns
+    a list, `readArray` an `array.array` of the matching typecode and `readNumpy` a
+    `numpy.ndarray`.
+
+    Besides iterables of numbers, `write` takes `array.array`s and buffers (e.g. `memoryview`s)
+    with the element format, which are copied in bulk, and `numpy.ndarray`s, which are range
+    checked and converted to big-endian by NumPy.  NumPy is only used if it is installed; it's
+    never imported just to check the type of an argument.
+    """
+
+    TYPECODE = None
+    ITEM_SIZE = None
+    NUMPY_DTYPE = None
+
+    @classmethod
+    def readArray(cls, buf):
+        count = buf.readI32()
+        if count < 0:
+            raise InternalError("Unexpected negative sequence length")
+        items = array.array(cls.TYPECODE)
+        items.frombytes(buf.readView(count * cls.ITEM_SIZE))
+        if _UNIFFI_ARRAY_BYTESWAP and cls.ITEM_SIZE > 1:
+            items.byteswap()
+        return items
+
+    @classmethod
+    def read(cls, buf):
+        return cls.readArray(buf).tolist()
+
+    @classmethod
+    def readNumpy(cls, buf):
+        import numpy
+
+        count = buf.readI32()
+        if count < 0:
+            raise InternalError("Unexpected negative sequence length")
+        # Copies out of the RustBuffer, converting to native byte order
+        items = numpy.frombuffer(buf.readView(count * cls.ITEM_SIZE), dtype=">" + cls.NUMPY_DTYPE)
+        return items.astype("=" + cls.NUMPY_DTYPE)
+
+    @classmethod
+    def liftArray(cls, rbuf):
+        with rbuf.consumeWithStream() as stream:
+            return cls.readArray(stream)
+
+    @classmethod
+    def liftNumpy(cls, rbuf):
+        with rbuf.consumeWithStream() as stream:
+            return cls.readNumpy(stream)
+
+    @classmethod
+    def _to_array(cls, value):
+        items = array.array(cls.TYPECODE)
+        if isinstance(value, (array.array, memoryview)) and _uniffi_buffer_format(value) == cls.TYPECODE:
+            # Copy, since the result gets byteswapped in place
+            items.frombytes(memoryview(value).cast("B"))
+            return items
+        if isinstance(value, (bytes, bytearray)):
+            # Don't let `array.array` reinterpret the raw bytes, these are individual elements
+            value = iter(value)
+        elif isinstance(value, array.array):
+            # `extend` only takes arrays of the same typecode
+            value = value.tolist()
+        try:
+            items.extend(value)
+        except OverflowError:
+            raise cls._range_error()
+        return items
+
+    @classmethod
+    def _range_error(cls):
+        return ValueError("{} requires {} <= value < {}".format(cls.CLASS_NAME, cls.VALUE_MIN, cls.VALUE_MAX))
+
+    @classmethod
+    def _write_numpy(cls, numpy, value, buf):
+        if value.dtype.kind not in "biuf":
+            raise TypeError("unsupported array dtype {}".format(value.dtype))
+        target = numpy.dtype(">" + cls.NUMPY_DTYPE)
+        if target.kind != "f":
+            # Match `array.array`: no silent float truncation or integer wrap-around
+            if value.dtype.kind == "f":
+                raise TypeError("'float' object cannot be interpreted as an integer")
+            if value.size and not numpy.can_cast(value.dtype, target):
+                if value.min() < cls.VALUE_MIN or value.max() >= cls.VALUE_MAX:
+                    raise cls._range_error()
+        items = numpy.ascontiguousarray(value.reshape(-1), dtype=target)
+        buf.writeI32(items.size)
+        buf.write(items.view(numpy.uint8))
+
+    @classmethod
+    def encodedSize(cls, value):
+        """
+        Size of the encoding of `value`, which must have a length (not be a one-shot iterator).
+        """
+        numpy = sys.modules.get("numpy")
+        if numpy is not None and isinstance(value, numpy.ndarray):
+            count = value.size
+        elif isinstance(value, memoryview):
+            count = value.nbytes // value.itemsize
+        else:
+            count = len(value)
+        return 4 + count * cls.ITEM_SIZE
+
+    @classmethod
+    def lower(cls, value):
+        if not hasattr(value, "__len__"):
+            # Collect the items of an iterator first, to know the size of the buffer
+            value = cls._to_array(value)
+        return super().lower(value)
+
+    @classmethod
+    def write(cls, value, buf):
+        numpy = sys.modules.get("numpy")
+        if numpy is not None and isinstance(value, numpy.ndarray):
+            cls._write_numpy(numpy, value, buf)
+            return
+        items = cls._to_array(value)
+        buf.writeI32(len(items))
+        if _UNIFFI_ARRAY_BYTESWAP and cls.ITEM_SIZE > 1:
+            items.byteswap()
+        buf.write(items)
+
+class FfiConverterSequenceInt8(FfiConverterSequenceFixedWidth):
+    TYPECODE = "b"
+    ITEM_SIZE = 1
+    NUMPY_DTYPE = "i1"
+    CLASS_NAME = "i8"
+    VALUE_MIN = -2**7
+    VALUE_MAX = 2**7
+
+class FfiConverterSequenceUInt8(FfiConverterSequenceFixedWidth):
+    TYPECODE = "B"
+    ITEM_SIZE = 1
+    NUMPY_DTYPE = "u1"
+    CLASS_NAME = "u8"
+    VALUE_MIN = 0
+    VALUE_MAX = 2**8
+
+    @classmethod
+    def readBytes(cls, buf):
+        count = buf.readI32()
+        if count < 0:
+            raise InternalError("Unexpected negative sequence length")
+        return buf.read(count)
+
+    @classmethod
+    def write(cls, value, buf):
+        if isinstance(value, (bytes, bytearray)):
+            buf.writeI32(len(value))
+            buf.write(value)
+        elif isinstance(value, memoryview) and _uniffi_buffer_format(value) == "B":
+            buf.writeI32(value.nbytes)
+            buf.write(value)
+        else:
+            super().write(value, buf)
+
+class FfiConverterSequenceInt16(FfiConverterSequenceFixedWidth):
+    TYPECODE = _uniffi_array_typecode("h", 2)
+    ITEM_SIZE = 2
+    NUMPY_DTYPE = "i2"
+    CLASS_NAME = "i16"
+    VALUE_MIN = -2**15
+    VALUE_MAX = 2**15
+
+class FfiConverterSequenceUInt16(FfiConverterSequenceFixedWidth):
+    TYPECODE = _uniffi_array_typecode("H", 2)
+    ITEM_SIZE = 2
+    NUMPY_DTYPE = "u2"
+    CLASS_NAME = "u16"
+    VALUE_MIN = 0
+    VALUE_MAX = 2**16
+
+class FfiConverterSequenceInt32(FfiConverterSequenceFixedWidth):
+    TYPECODE = _uniffi_array_typecode("il", 4)
+    ITEM_SIZE = 4
+    NUMPY_DTYPE = "i4"
+    CLASS_NAME = "i32"
+    VALUE_MIN = -2**31
+    VALUE_MAX = 2**31
+
+class FfiConverterSequenceUInt32(FfiConverterSequenceFixedWidth):
+    TYPECODE = _uniffi_array_typecode("IL", 4)
+    ITEM_SIZE = 4
+    NUMPY_DTYPE = "u4"
+    CLASS_NAME = "u32"
+    VALUE_MIN = 0
+    VALUE_MAX = 2**32
+
+class FfiConverterSequenceInt64(FfiConverterSequenceFixedWidth):
+    TYPECODE = _uniffi_array_typecode("lq", 8)
+    ITEM_SIZE = 8
+    NUMPY_DTYPE = "i8"
+    CLASS_NAME = "i64"
+    VALUE_MIN = -2**63
+    VALUE_MAX = 2**63
+
+class FfiConverterSequenceUInt64(FfiConverterSequenceFixedWidth):
+    TYPECODE = _uniffi_array_typecode("LQ", 8)
+    ITEM_SIZE = 8
+    NUMPY_DTYPE = "u8"
+    CLASS_NAME = "u64"
+    VALUE_MIN = 0
+    VALUE_MAX = 2**64
+
+class FfiConverterSequenceFloat(FfiConverterSequenceFixedWidth):
+    TYPECODE = "f"
+    ITEM_SIZE = 4
+    NUMPY_DTYPE = "f4"
+
+class FfiConverterSequenceDouble(FfiConverterSequenceFixedWidth):
+    TYPECODE = "d"
+    ITEM_SIZE = 8
+    NUMPY_DTYPE = "f8"
 
 
 # Type alias
 CustomType = bytes
 
 class FfiConverterTypeCustomType:
+    @staticmethod
+    def encodedSize(value):
+        return FfiConverterBytes.encodedSize(value)
+
     @staticmethod
     def write(value, buf):
         FfiConverterBytes.write(value, buf)
@@ -640,34 +1764,292 @@ class FfiConverterTypeCustomType:
         return FfiConverterBytes.lower(value)
 
 
-# Type alias
-CustomType = typing.List[int]
+# Specialized lowering and lifting for the CustomType signatures.
+#
+# These do the same as `FfiConverterTypeCustomType.lower`/`lift`, but as a single function
+# each: the struct format is inlined, the buffer is allocated at its final size instead of
+# going through RustBufferBuilder, and there are no context-manager generators.  Values the
+# fast path doesn't cover go through the converter chain, so behavior is the same for every
+# input.
+
+def _uniffi_lower_CustomType(value):
+    if not isinstance(value, (bytes, bytearray)):
+        return FfiConverterTypeCustomType.lower(value)
+    size = len(value)
+    rbuf = RustBuffer.alloc(size + 4)
+    try:
+        view = rbuf.asMemoryview(size + 4)
+        _UNIFFI_STRUCT_I32.pack_into(view, 0, size)
+        view[4:] = value
+        view.release()
+    except:
+        rbuf.free()
+        raise
+    rbuf.len = size + 4
+    return rbuf
+
+def _uniffi_lift_CustomType(rbuf):
+    try:
+        view = rbuf.asMemoryview()
+        try:
+            if len(view) < 4:
+                raise InternalError("read past end of rust buffer")
+            size = _UNIFFI_STRUCT_I32.unpack_from(view, 0)[0]
+            if size < 0:
+                raise InternalError("Unexpected negative byte string length")
+            if 4 + size > len(view):
+                raise InternalError("read past end of rust buffer")
+            if 4 + size != len(view):
+                raise RuntimeError("junk data left in buffer at end of consumeWithStream")
+            if _uniffi_lift_cache is not None:
+                return _uniffi_lift_cache.liftBytes(view[4:])
+            return view[4:].tobytes()
+        finally:
+            view.release()
+    finally:
+        rbuf.free()
 
-class FfiConverterTypeCustomType:
-    @staticmethod
-    def write(value, buf):
-        FfiConverterSequenceUInt8.write(value, buf)
+def test_fn(type_param: "CustomType"):
+    if _uniffi_instrumentation is not None or _uniffi_lower_cache is not None:
+        _uniffi_call_test_fn(_uniffi_lower_arg("test_fn", _uniffi_lower_CustomType, type_param))
+        return
+    _uniffi_call_test_fn(_uniffi_lower_CustomType(type_param))
+
+def _uniffi_lower_arg(name, lower, value):
+    # Lowering for when the lower cache or instrumentation is enabled
+    start = _uniffi_lower_start()
+    if _uniffi_lower_cache is not None:
+        rbuf = _uniffi_lower_cache.lower(lower, value)
+    else:
+        rbuf = lower(value)
+    _uniffi_record_lower(name, start)
+    return rbuf
 
-    @staticmethod
-    def read(buf):
-        return FfiConverterSequenceUInt8.read(buf)
+def _uniffi_lower_start():
+    # Start of the lower phase of a call, for `_uniffi_record_lower`
+    return _uniffi_instrumentation.now() if _uniffi_instrumentation is not None else None
 
-    @staticmethod
-    def lift(value):
-        return FfiConverterSequenceUInt8.lift(value)
+def _uniffi_record_lower(name, start):
+    if start is not None and _uniffi_instrumentation is not None:
+        _uniffi_instrumentation.record_phase(name, "lower", start)
 
-    @staticmethod
-    def lower(value):
-        return FfiConverterSequenceUInt8.lower(value)
+def test_fn_many(type_params: "Iterable[CustomType]", chunk_bytes=1 << 20, chunk_len=4096):
+    """
+    Call `test_fn` for each value of `type_params`, which can be any iterable (including a generator).
 
-def test_fn(type_param: "CustomType"):
-    
-    rust_call(_UniFFILib.uniffi_uniffi_custom_bug_fn_func_test_fn,
-        FfiConverterTypeCustomType.lower(type_param))
+    The values are packed into a single `Vec<CustomType>` buffer and handed to Rust in one call,
+    flushing every `chunk_len` values or `chunk_bytes` bytes so memory use stays bounded.  Errors
+    behave as with a loop over `test_fn`: every value before the failing one has been processed.
+    """
+    builder = None
+    count = 0
+    try:
+        for type_param in type_params:
+            if builder is None:
+                start = _uniffi_lower_start()
+                builder = RustBufferBuilder()
+                builder.writeI32(0)
+                count = 0
+            mark = builder.rbuf.len
+            try:
+                FfiConverterTypeCustomType.write(type_param, builder)
+            except:
+                # Process the values before this one, then report the error
+                builder.rbuf.len = mark
+                rbuf, builder = _uniffi_finalize_batch(builder, count), None
+                if rbuf is not None:
+                    _uniffi_record_lower("test_fn_many", start)
+                    _uniffi_call_test_fn_many(rbuf)
+                raise
+            count += 1
+            if count >= chunk_len or builder.rbuf.len >= chunk_bytes:
+                rbuf, builder = _uniffi_finalize_batch(builder, count), None
+                _uniffi_record_lower("test_fn_many", start)
+                _uniffi_call_test_fn_many(rbuf)
+        if builder is not None:
+            rbuf, builder = _uniffi_finalize_batch(builder, count), None
+            _uniffi_record_lower("test_fn_many", start)
+            _uniffi_call_test_fn_many(rbuf)
+    finally:
+        if builder is not None:
+            builder.discard()
+
+def test_fn_borrowed(type_param: "CustomType"):
+    """
+    Like `test_fn`, but Rust reads the bytes straight out of `type_param` for the duration of
+    the call instead of receiving a copy in a RustBuffer.
+
+    `type_param` can be any contiguous buffer, e.g. an `mmap.mmap`, `bytearray` or `memoryview`.
+    It must not be modified by other threads during the call.
+    """
+    start = _uniffi_lower_start()
+    with uniffi_borrow_bytes(type_param) as foreign_bytes:
+        _uniffi_record_lower("test_fn_borrowed", start)
+        _uniffi_call_test_fn_borrowed(foreign_bytes)
+
+def test_fn_stream(source, chunk_size=1 << 20):
+    """
+    Like `test_fn`, for values that are too large to lower in one piece.
 
+    `source` is a binary file-like object or an iterable of bytes-like chunks.  The value is
+    handed to Rust in chunks of at most `chunk_size` bytes, so the bindings never hold more
+    than one chunk of it, and it isn't subject to the 2 GiB limit of a RustBuffer.
+    """
+    if not 0 < chunk_size <= _RUST_BUFFER_MAX_SIZE:
+        raise ValueError("chunk_size must be between 1 and {}".format(_RUST_BUFFER_MAX_SIZE))
+    session = rust_call(_UniFFILib.uniffi_uniffi_custom_bug_fn_func_test_fn_stream_open)
+    try:
+        for chunk in _uniffi_stream_chunks(source, chunk_size):
+            start = _uniffi_lower_start()
+            with uniffi_borrow_bytes(chunk) as foreign_bytes:
+                _uniffi_record_lower("test_fn_stream_push", start)
+                _uniffi_call_test_fn_stream_push(session, foreign_bytes)
+    except:
+        rust_call(_UniFFILib.uniffi_uniffi_custom_bug_fn_func_test_fn_stream_abort, session)
+        raise
+    rust_call(_UniFFILib.uniffi_uniffi_custom_bug_fn_func_test_fn_stream_finish, session)
+
+def _uniffi_stream_chunks(source, chunk_size):
+    # Yield the contents of `source` as bytes-like chunks of at most `chunk_size` bytes
+    readinto = getattr(source, "readinto", None)
+    if readinto is not None:
+        chunk = bytearray(chunk_size)
+        with memoryview(chunk) as view:
+            while True:
+                size = readinto(view)
+                if not size:
+                    return
+                yield view[:size]
+    read = getattr(source, "read", None)
+    if read is not None:
+        source = iter(lambda: read(chunk_size), b"")
+    for chunk in source:
+        with memoryview(chunk).cast("B") as view:
+            for offset in range(0, view.nbytes, chunk_size):
+                yield view[offset:offset + chunk_size]
+
+async def test_fn_async(type_param: "CustomType"):
+    """
+    Awaitable version of `test_fn`.
+
+    The value is lowered and passed to Rust on the blocking executor (see
+    `uniffi_set_blocking_executor`).  ctypes releases the GIL for the duration of the FFI call,
+    so large payloads don't stall the event loop.  With `uniffi_enable_async_batching`,
+    concurrent calls share FFI calls.
+    """
+    if _uniffi_async_batcher is not None:
+        return await _uniffi_async_batcher.submit(type_param)
+    return await _uniffi_run_blocking(test_fn, type_param)
+
+def _uniffi_finalize_batch(builder, count):
+    # Fill in the sequence length and take the buffer, or free it if there's nothing to send
+    if count == 0:
+        builder.discard()
+        return None
+    builder.patchI32(0, count)
+    return builder.finalize()
+
+def _uniffi_test_fn_batch(type_params):
+    # Call `test_fn` for each of `type_params` with as few `test_fn_many` calls as possible,
+    # and return the exception of each call, or None.  Runs on the blocking executor.
+    errors = [None] * len(type_params)
+    pending = range(len(type_params))
+    while pending:
+        # Indices of the values in the buffer
+        sent = []
+        start = _uniffi_lower_start()
+        builder = RustBufferBuilder()
+        builder.writeI32(0)
+        try:
+            for i in pending:
+                mark = builder.rbuf.len
+                try:
+                    FfiConverterTypeCustomType.write(type_params[i], builder)
+                except Exception as e:
+                    # This one fails on its own, the others still go to Rust
+                    builder.rbuf.len = mark
+                    errors[i] = e
+                    continue
+                sent.append(i)
+            rbuf, builder = _uniffi_finalize_batch(builder, len(sent)), None
+        finally:
+            if builder is not None:
+                builder.discard()
+        if rbuf is None:
+            break
+        _uniffi_record_lower("test_fn_many", start)
+        processed = ctypes.c_int32()
+        try:
+            _uniffi_call_test_fn_many(rbuf, processed)
+            break
+        except Exception as e:
+            # Rust processed the values before the one it failed on, and none after it: that
+            # one gets the error, and the values after it go again
+            failed = processed.value
+            if failed >= len(sent):
+                raise
+            errors[sent[failed]] = e
+            pending = sent[failed + 1:]
+    return errors
+
+# Shared memory segments a pool worker has attached to, most recently used last
+_uniffi_worker_segments = collections.OrderedDict()
+
+_UNIFFI_WORKER_MAX_SEGMENTS = 4
+
+def _uniffi_process_pool_init():
+    # Load the library once per worker, rather than on its first call
+    _uniffi_ensure_library()
+
+def _uniffi_process_pool_test_fn(name, offset, size):
+    from multiprocessing import shared_memory
+
+    segment = _uniffi_worker_segments.pop(name, None)
+    if segment is None:
+        segment = shared_memory.SharedMemory(name=name)
+        while len(_uniffi_worker_segments) >= _UNIFFI_WORKER_MAX_SEGMENTS:
+            _uniffi_worker_segments.popitem(last=False)[1].close()
+    _uniffi_worker_segments[name] = segment
+    with segment.buf[offset:offset + size] as view:
+        test_fn_borrowed(view)
+
+try:
+    from . import _uniffi_custom_bug_runtime as _uniffi_runtime
+except ImportError:
+    import _uniffi_custom_bug_runtime as _uniffi_runtime
+
+_uniffi_runtime._uniffi_init(sys.modules[__name__])
+
+UniFfiRustBufferPool = _uniffi_runtime.UniFfiRustBufferPool
+uniffi_enable_rustbuffer_pool = _uniffi_runtime.uniffi_enable_rustbuffer_pool
+uniffi_disable_rustbuffer_pool = _uniffi_runtime.uniffi_disable_rustbuffer_pool
+UniFfiLiftCache = _uniffi_runtime.UniFfiLiftCache
+uniffi_enable_lift_cache = _uniffi_runtime.uniffi_enable_lift_cache
+uniffi_disable_lift_cache = _uniffi_runtime.uniffi_disable_lift_cache
+UniFfiLowerCache = _uniffi_runtime.UniFfiLowerCache
+uniffi_enable_lower_cache = _uniffi_runtime.uniffi_enable_lower_cache
+uniffi_disable_lower_cache = _uniffi_runtime.uniffi_disable_lower_cache
+UniFfiBufferSnapshot = _uniffi_runtime.UniFfiBufferSnapshot
+UniFfiBufferTracker = _uniffi_runtime.UniFfiBufferTracker
+uniffi_enable_buffer_tracking = _uniffi_runtime.uniffi_enable_buffer_tracking
+uniffi_disable_buffer_tracking = _uniffi_runtime.uniffi_disable_buffer_tracking
+UniFfiInstrumentation = _uniffi_runtime.UniFfiInstrumentation
+uniffi_enable_instrumentation = _uniffi_runtime.uniffi_enable_instrumentation
+uniffi_disable_instrumentation = _uniffi_runtime.uniffi_disable_instrumentation
+UniFfiBatchedCallbacks = _uniffi_runtime.UniFfiBatchedCallbacks
+uniffi_enable_batched_callbacks = _uniffi_runtime.uniffi_enable_batched_callbacks
+uniffi_disable_batched_callbacks = _uniffi_runtime.uniffi_disable_batched_callbacks
+UniFfiAsyncBatcher = _uniffi_runtime.UniFfiAsyncBatcher
+uniffi_enable_async_batching = _uniffi_runtime.uniffi_enable_async_batching
+uniffi_disable_async_batching = _uniffi_runtime.uniffi_disable_async_batching
+UniFfiProcessPool = _uniffi_runtime.UniFfiProcessPool
 
 __all__ = [
     "InternalError",
     "test_fn",
+    "test_fn_many",
+    "test_fn_borrowed",
+    "test_fn_stream",
+    "test_fn_async",
 ]
 
@@ -0,0 +1,1185 @@
+"""
+Hand-written runtime of the UniffiCustomBug bindings.
+
+The RustBuffer pool, the lift and lower caches, buffer tracking, instrumentation, batched
+foreign executor callbacks, async call batching and the process pool live here rather than in
+the generated UniffiCustomBug.py, so that regenerating the bindings doesn't lose them.
+
+The bindings import this module at the end and hand themselves to `_uniffi_init()`, and they
+re-export its public names.  Their hot paths only check the hook globals (e.g.
+`_uniffi_rustbuffer_pool`), which the `uniffi_enable_*` functions here set on them.
+"""
+
+import collections
+import contextlib
+import ctypes
+import itertools
+import sys
+import threading
+import time
+import weakref
+
+# The UniffiCustomBug module, set by `_uniffi_init()`
+_bindings = None
+
+def _uniffi_init(bindings):
+    global _bindings
+    _bindings = bindings
+
+class _UniFfiRustBufferCache:
+    """
+    Per-thread free lists of a UniFfiRustBufferPool, indexed by size class.
+    """
+
+    def __init__(self, num_classes, retired):
+        self.classes = [collections.deque() for _ in range(num_classes)]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Counters of the pool's exited threads, which this cache adds itself to when it goes away
+        self.retired = retired
+
+    def free_all(self):
+        bufs = [rbuf for free_list in self.classes for rbuf in free_list]
+        for free_list in self.classes:
+            free_list.clear()
+        if bufs:
+            _bindings.rust_call(_bindings._UniFFILib.ffi_UniffiCustomBug_rustbuffer_free_many, (_bindings.RustBuffer * len(bufs))(*bufs), len(bufs))
+
+    def __del__(self):
+        self.retired["hits"] += self.hits
+        self.retired["misses"] += self.misses
+        self.retired["evictions"] += self.evictions
+        try:
+            self.free_all()
+        except Exception:
+            # The library may already be gone at interpreter shutdown
+            pass
+
+class UniFfiRustBufferPool:
+    """
+    Size-classed pool of RustBuffers, batching allocation crossings.
+
+    `RustBuffer.alloc` takes buffers from per-thread free lists keyed by power-of-two capacity
+    class, and a miss refills the class with one `rustbuffer_alloc_many` call, so small
+    allocations cross the FFI once per `refill_count` buffers instead of once each.  Buffers
+    the bindings free themselves (lifted values, error buffers, discarded builders) go back to
+    the free lists, and full classes evict their oldest half with one `rustbuffer_free_many`
+    call.  Sizes above `max_class_size` bypass the pool.
+
+    Arguments are not recycled: Rust takes ownership of a lowered RustBuffer and frees it
+    itself, so each of them still costs a Rust allocation and deallocation, only the
+    allocation crossing is amortized.
+
+    Pooled buffers are not zeroed.  Use `uniffi_enable_rustbuffer_pool()` to install a pool.
+    """
+
+    MIN_CLASS_SHIFT = 6
+
+    def __init__(self, max_class_size=64 * 1024, max_buffers_per_class=32, refill_count=8):
+        self.max_class_shift = max(self.MIN_CLASS_SHIFT, (max_class_size - 1).bit_length())
+        self.max_buffers_per_class = max_buffers_per_class
+        self.refill_count = refill_count
+        self.closed = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._caches = weakref.WeakSet()
+        self._retired = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _cache(self):
+        try:
+            return self._local.cache
+        except AttributeError:
+            cache = _UniFfiRustBufferCache(self.max_class_shift + 1, self._retired)
+            self._local.cache = cache
+            with self._lock:
+                self._caches.add(cache)
+            return cache
+
+    def alloc(self, size):
+        shift = max(self.MIN_CLASS_SHIFT, (size - 1).bit_length())
+        if self.closed or shift > self.max_class_shift:
+            return _bindings.rust_call(_bindings._UniFFILib.ffi_UniffiCustomBug_rustbuffer_alloc, size)
+        cache = self._cache()
+        free_list = cache.classes[shift]
+        if free_list:
+            cache.hits += 1
+            rbuf = free_list.pop()
+        else:
+            cache.misses += 1
+            count = self.refill_count
+            bufs = (_bindings.RustBuffer * count)()
+            _bindings.rust_call(_bindings._UniFFILib.ffi_UniffiCustomBug_rustbuffer_alloc_many, 1 << shift, count, bufs)
+            free_list.extend(bufs[1:])
+            rbuf = bufs[0]
+        rbuf.len = size
+        return rbuf
+
+    def release(self, rbuf):
+        capacity = rbuf.capacity
+        shift = capacity.bit_length() - 1
+        if self.closed or not rbuf.data or not self.MIN_CLASS_SHIFT <= shift <= self.max_class_shift:
+            return _bindings.rust_call(_bindings._UniFFILib.ffi_UniffiCustomBug_rustbuffer_free, rbuf)
+        cache = self._cache()
+        free_list = cache.classes[shift]
+        if len(free_list) >= self.max_buffers_per_class:
+            # Evict the oldest half of the class in one go
+            count = max(1, len(free_list) // 2)
+            bufs = (_bindings.RustBuffer * count)(*(free_list.popleft() for _ in range(count)))
+            cache.evictions += count
+            _bindings.rust_call(_bindings._UniFFILib.ffi_UniffiCustomBug_rustbuffer_free_many, bufs, count)
+        # Copy the struct, the caller still holds on to `rbuf`
+        free_list.append(_bindings.RustBuffer(capacity, 0, rbuf.data))
+
+    def trim(self):
+        """
+        Free the buffers cached by the current thread.
+
+        Other threads' caches are freed when those threads exit.
+        """
+        self._cache().free_all()
+
+    def close(self):
+        self.closed = True
+        self.trim()
+
+    def _after_fork(self):
+        # In a forked child: drop the state of threads that don't exist there and locks that
+        # may have been held during the fork.  The cached buffers are copies private to the
+        # child, they are simply forgotten.
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._caches = weakref.WeakSet()
+        self._retired = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def stats(self):
+        with self._lock:
+            caches = list(self._caches)
+        stats = dict(self._retired, cached_buffers=0, cached_bytes=0)
+        for cache in caches:
+            stats["hits"] += cache.hits
+            stats["misses"] += cache.misses
+            stats["evictions"] += cache.evictions
+            for free_list in list(cache.classes):
+                for rbuf in list(free_list):
+                    stats["cached_buffers"] += 1
+                    stats["cached_bytes"] += rbuf.capacity
+        return stats
+
+def uniffi_enable_rustbuffer_pool(**options):
+    """
+    Install a UniFfiRustBufferPool (see there for `options`), replacing any previous one.
+    """
+    uniffi_disable_rustbuffer_pool()
+    _bindings._uniffi_rustbuffer_pool = UniFfiRustBufferPool(**options)
+    return _bindings._uniffi_rustbuffer_pool
+
+def uniffi_disable_rustbuffer_pool():
+    pool = _bindings._uniffi_rustbuffer_pool
+    _bindings._uniffi_rustbuffer_pool = None
+    if pool is not None:
+        pool.close()
+
+class UniFfiLiftCache:
+    """
+    Bounded LRU cache of lifted `str` and `bytes` values, keyed by their encoded bytes.
+
+    Workloads that get the same keys or tags back from Rust over and over then share one
+    immutable object per distinct value instead of keeping a new one per lift.  A hit only
+    allocates the short-lived lookup key (memoryviews over ctypes memory aren't hashable) and
+    skips decoding.  Only values of at most `max_value_size` encoded bytes are cached; each kind
+    keeps at most `max_entries`.
+
+    Install with `uniffi_enable_lift_cache()`.
+    """
+
+    def __init__(self, max_entries=4096, max_value_size=256):
+        self.max_entries = max_entries
+        self.max_value_size = max_value_size
+        self._lock = threading.Lock()
+        self._entries = {str: collections.OrderedDict(), bytes: collections.OrderedDict()}
+        self._counters = {kind: dict(hits=0, misses=0, evictions=0) for kind in self._entries}
+
+    def _lift(self, kind, view, make):
+        if len(view) > self.max_value_size:
+            return make(view)
+        key = view.tobytes()
+        entries = self._entries[kind]
+        counters = self._counters[kind]
+        with self._lock:
+            value = entries.get(key)
+            if value is not None:
+                entries.move_to_end(key)
+                counters["hits"] += 1
+                return value
+            counters["misses"] += 1
+        value = key if kind is bytes else make(view)
+        with self._lock:
+            entries[key] = value
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                counters["evictions"] += 1
+        return value
+
+    def liftString(self, view):
+        """
+        The `str` for the UTF-8 bytes in `view`.
+        """
+        return self._lift(str, view, lambda view: str(view, "utf-8"))
+
+    def liftBytes(self, view):
+        """
+        The `bytes` with the contents of `view`.
+        """
+        return self._lift(bytes, view, bytes)
+
+    def _after_fork(self):
+        # The entries stay valid in a forked child, only the lock needs replacing
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            for entries in self._entries.values():
+                entries.clear()
+
+    def stats(self):
+        """
+        Per-kind hits, misses, evictions, hit rate, number of entries and bytes of keys held.
+        """
+        with self._lock:
+            result = {}
+            for kind, entries in self._entries.items():
+                counters = dict(self._counters[kind])
+                lookups = counters["hits"] + counters["misses"]
+                counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+                counters["entries"] = len(entries)
+                counters["key_bytes"] = sum(map(len, entries))
+                result[kind.__name__] = counters
+            return result
+
+def uniffi_enable_lift_cache(**options):
+    """
+    Install a UniFfiLiftCache (see there for `options`), replacing any previous one.
+    """
+    _bindings._uniffi_lift_cache = UniFfiLiftCache(**options)
+    return _bindings._uniffi_lift_cache
+
+def uniffi_disable_lift_cache():
+    _bindings._uniffi_lift_cache = None
+
+class UniFfiLowerCache:
+    """
+    Bounded LRU cache of the encoded form of immutable arguments.
+
+    For callers that pass the same values over and over (configuration blobs, model keys),
+    lowering a cached value skips the converter entirely: Rust copies the cached encoding into
+    a fresh RustBuffer with a single `rustbuffer_from_bytes` call.  Only `bytes`, `str`, `int`
+    and tuples of those are cached, since the encoding of a mutable value could go stale.
+    The cache holds at most `max_bytes` bytes, counting both the encodings and the values they
+    are keyed by, and values whose encoding is larger than `max_value_size` aren't cached.
+
+    Install with `uniffi_enable_lower_cache()`.
+    """
+
+    CACHEABLE_TYPES = (bytes, str, int, tuple)
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_value_size=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_value_size = max_value_size
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._held_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _cacheable(self, value):
+        if type(value) is tuple:
+            return all(self._cacheable(item) for item in value)
+        return type(value) in self.CACHEABLE_TYPES
+
+    @staticmethod
+    def _value_size(value):
+        # Memory the key keeps alive: the entry holds a reference to the value
+        if type(value) is tuple:
+            return sys.getsizeof(value) + sum(UniFfiLowerCache._value_size(item) for item in value)
+        return sys.getsizeof(value)
+
+    def lower(self, lower, value):
+        """
+        Lower `value` with the `lower` function, using the cached encoding if there is one.
+        """
+        if not self._cacheable(value):
+            return lower(value)
+        # The lowering function is part of the key, the same value can be encoded differently
+        # for different types.
+        key = (lower, type(value), value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+            else:
+                self._misses += 1
+        if entry is not None:
+            # entry[1] points into entry[0], which the entry keeps alive
+            rbuf = _bindings.rust_call(_bindings._UniFFILib.ffi_UniffiCustomBug_rustbuffer_from_bytes, entry[1])
+            if _bindings._uniffi_buffer_tracker is not None:
+                _bindings._uniffi_buffer_tracker.track(rbuf)
+            return rbuf
+        rbuf = lower(value)
+        if rbuf.len <= self.max_value_size:
+            self._insert(key, rbuf.asMemoryview().tobytes(), self._value_size(value))
+        return rbuf
+
+    def _insert(self, key, encoded, value_size):
+        foreign_bytes = _bindings.ForeignBytes(len(encoded), ctypes.cast(ctypes.c_char_p(encoded), ctypes.POINTER(ctypes.c_char)))
+        size = len(encoded) + value_size
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._held_bytes -= previous[2]
+            self._entries[key] = (encoded, foreign_bytes, size)
+            self._held_bytes += size
+            while self._held_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._held_bytes -= evicted_size
+                self._evictions += 1
+
+    def _after_fork(self):
+        # The entries stay valid in a forked child, only the lock needs replacing
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._held_bytes = 0
+
+    def stats(self):
+        """
+        Hits, misses, evictions, hit rate, number of entries and bytes held (encodings and keys).
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "held_bytes": self._held_bytes,
+            }
+
+def uniffi_enable_lower_cache(**options):
+    """
+    Install a UniFfiLowerCache (see there for `options`), replacing any previous one.
+    """
+    _bindings._uniffi_lower_cache = UniFfiLowerCache(**options)
+    return _bindings._uniffi_lower_cache
+
+def uniffi_disable_lower_cache():
+    _bindings._uniffi_lower_cache = None
+
+class UniFfiBufferSnapshot:
+    """
+    The RustBuffers that were live when `UniFfiBufferTracker.snapshot()` was called.
+
+    `sites` maps each call site ("file:line" of the first frame outside the bindings) to the
+    number of live buffers allocated there and their total capacity.
+    """
+
+    def __init__(self, sites, live_bytes, high_water_bytes):
+        self.sites = sites
+        self.live_bytes = live_bytes
+        self.high_water_bytes = high_water_bytes
+
+    def compare_to(self, old):
+        """
+        Per-site growth since the `old` snapshot, as `(site, count_diff, bytes_diff)` tuples,
+        largest growth in bytes first.  Sites without a change are left out.
+        """
+        diffs = []
+        for site in set(self.sites) | set(old.sites):
+            count, size = self.sites.get(site, (0, 0))
+            old_count, old_size = old.sites.get(site, (0, 0))
+            if count != old_count or size != old_size:
+                diffs.append((site, count - old_count, size - old_size))
+        diffs.sort(key=lambda diff: diff[2], reverse=True)
+        return diffs
+
+class UniFfiBufferTracker:
+    """
+    Accounting of the RustBuffers the bindings own, to find native memory leaks.
+
+    Native allocations don't show up in tracemalloc, so this tracks them itself: a buffer is
+    live from `RustBuffer.alloc` (or `reserve`) until it is freed or handed over to Rust as an
+    argument.  Buffers received from Rust are live while a RustBufferView or RustBufferChunks
+    holds on to them, since those can outlive the call that lifted them.  For each live buffer
+    it records its capacity and the call site that allocated it and, with `traceback_limit`, a
+    traceback of that many frames.  Take `snapshot()`s and `compare_to()` them to see which call
+    sites keep growing.
+
+    Install with `uniffi_enable_buffer_tracking()`.
+    """
+
+    def __init__(self, traceback_limit=0):
+        self.traceback_limit = traceback_limit
+        self._lock = threading.Lock()
+        # Buffer address -> (capacity, call site, traceback or None)
+        self._live = {}
+        self._live_bytes = 0
+        self._high_water_bytes = 0
+
+    @staticmethod
+    def _caller_frame():
+        # The first frame outside the bindings (and the context-managers they use)
+        frame = sys._getframe(2)
+        while frame is not None and frame.f_code.co_filename in (__file__, _bindings.__file__, contextlib.__file__):
+            frame = frame.f_back
+        return frame
+
+    def track(self, rbuf):
+        if rbuf.capacity == 0:
+            # Nothing to leak, and Rust hands out the same dangling pointer for all of them
+            return
+        address = ctypes.cast(rbuf.data, ctypes.c_void_p).value
+        frame = self._caller_frame()
+        if frame is None:
+            site = "<bindings>"
+        else:
+            site = "{}:{}".format(frame.f_code.co_filename, frame.f_lineno)
+        stack = None
+        if self.traceback_limit and frame is not None:
+            import traceback
+            stack = traceback.format_stack(frame, limit=self.traceback_limit)
+        with self._lock:
+            previous = self._live.get(address)
+            if previous is not None:
+                # Tracked again by whoever owns it now
+                self._live_bytes -= previous[0]
+            self._live[address] = (rbuf.capacity, site, stack)
+            self._live_bytes += rbuf.capacity
+            self._high_water_bytes = max(self._high_water_bytes, self._live_bytes)
+
+    def untrack(self, rbuf):
+        # Buffers that were never tracked (e.g. lifted from Rust right away) are ignored
+        address = ctypes.cast(rbuf.data, ctypes.c_void_p).value
+        with self._lock:
+            entry = self._live.pop(address, None)
+            if entry is not None:
+                self._live_bytes -= entry[0]
+
+    def live_bytes(self):
+        return self._live_bytes
+
+    def _after_fork(self):
+        # A forked child owns copies of the parent's live buffers, so they stay tracked
+        self._lock = threading.Lock()
+
+    def high_water_bytes(self):
+        return self._high_water_bytes
+
+    def live_buffers(self):
+        """
+        `(capacity, call site, traceback)` of each live buffer; the traceback is a list of
+        strings, or None without `traceback_limit`.
+        """
+        with self._lock:
+            return list(self._live.values())
+
+    def snapshot(self):
+        sites = {}
+        with self._lock:
+            for size, site, _ in self._live.values():
+                count, total = sites.get(site, (0, 0))
+                sites[site] = (count + 1, total + size)
+            return UniFfiBufferSnapshot(sites, self._live_bytes, self._high_water_bytes)
+
+def uniffi_enable_buffer_tracking(**options):
+    """
+    Install a UniFfiBufferTracker (see there for `options`), replacing any previous one.
+
+    Only buffers allocated from now on are tracked.
+    """
+    _bindings._uniffi_buffer_tracker = UniFfiBufferTracker(**options)
+    return _bindings._uniffi_buffer_tracker
+
+def uniffi_disable_buffer_tracking():
+    _bindings._uniffi_buffer_tracker = None
+
+class _UniFfiHistogram:
+    """
+    Latency histogram with power-of-two buckets: bucket `i` counts durations below 2**i ns.
+    """
+
+    __slots__ = ("buckets", "count", "total_ns")
+
+    def __init__(self):
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total_ns = 0
+
+    def record(self, ns):
+        self.buckets[min(ns.bit_length(), 63)] += 1
+        self.count += 1
+        self.total_ns += ns
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "total_ns": self.total_ns,
+            "buckets": {1 << i: n for i, n in enumerate(self.buckets) if n},
+        }
+
+class _UniFfiFunctionStats:
+    __slots__ = ("calls", "errors", "panics", "bytes_lowered", "bytes_lifted", "phases")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.panics = 0
+        self.bytes_lowered = 0
+        self.bytes_lifted = 0
+        self.phases = {phase: _UniFfiHistogram() for phase in UniFfiInstrumentation.PHASES}
+
+class _UniFfiThreadStats:
+    __slots__ = ("functions", "buffers")
+
+    def __init__(self):
+        self.functions = {}
+        self.buffers = dict.fromkeys(UniFfiInstrumentation.BUFFER_COUNTERS, 0)
+
+def _uniffi_ffi_arg_size(arg):
+    if isinstance(arg, (_bindings.RustBuffer, _bindings.ForeignBytes)):
+        return arg.len
+    return 0
+
+class UniFfiInstrumentation:
+    """
+    Opt-in per-call instrumentation of the FFI layer.
+
+    Records, per FFI function: the number of calls, errors and panics, the bytes lowered and
+    lifted, and latency histograms for these phases:
+
+    - lower: converting the arguments for the call, recorded by the functions that do it
+    - call: the FFI call itself
+    - check: inspecting the RustCallStatus afterwards
+    - lift: lifting the error or panic message of a failed call (none of the functions in this
+      interface return a value that needs lifting)
+
+    Also counts RustBuffer allocations, reserves and frees.  Counters are kept per thread, so recording doesn't take
+    any lock; `snapshot()` merges them.
+
+    Install with `uniffi_enable_instrumentation()`.  When it isn't installed the hot paths only
+    pay for one global lookup.
+    """
+
+    PHASES = ("lower", "call", "check", "lift")
+    BUFFER_COUNTERS = ("alloc", "alloc_bytes", "reserve", "reserve_bytes", "free", "free_bytes")
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop_exporting = None
+        self._export_interval = None
+
+    def _thread_stats(self):
+        try:
+            return self._local.stats
+        except AttributeError:
+            stats = self._local.stats = _UniFfiThreadStats()
+            with self._lock:
+                self._threads.append(stats)
+            return stats
+
+    def _function_stats(self, name):
+        functions = self._thread_stats().functions
+        stats = functions.get(name)
+        if stats is None:
+            stats = functions[name] = _UniFfiFunctionStats()
+        return stats
+
+    now = staticmethod(time.perf_counter_ns)
+
+    def record_phase(self, name, phase, start, nbytes=0):
+        """
+        Record the `lower` or `lift` phase of a call to `name` that began at `start` (from
+        `now()`).  For `lift`, `nbytes` is the size of the lifted buffer; the lowered bytes are
+        counted by `rust_call()` from the arguments themselves.
+        """
+        stats = self._function_stats(name)
+        stats.phases[phase].record(time.perf_counter_ns() - start)
+        if phase == "lift":
+            stats.bytes_lifted += nbytes
+
+    def rust_call(self, name, fn, error_ffi_converter, args):
+        """
+        Equivalent of the prebound `_uniffi_call_*` stubs, recording the call, check and lift
+        phases of `name`.
+        """
+        stats = self._function_stats(name)
+        call_status, call_status_ref = _bindings._uniffi_call_status()
+        start = time.perf_counter_ns()
+        result = fn(*args, call_status_ref)
+        called = time.perf_counter_ns()
+        stats.phases["call"].record(called - start)
+        stats.calls += 1
+        stats.bytes_lowered += sum(map(_uniffi_ffi_arg_size, args))
+        if not call_status.code:
+            stats.phases["check"].record(time.perf_counter_ns() - called)
+            return result
+        if call_status.code == _bindings.RustCallStatus.CALL_ERROR:
+            stats.errors += 1
+        elif call_status.code == _bindings.RustCallStatus.CALL_PANIC:
+            stats.panics += 1
+        # As in `_uniffi_check_reused_call_status`
+        status_copy = _bindings.RustCallStatus.from_buffer_copy(call_status)
+        call_status.code = _bindings.RustCallStatus.CALL_SUCCESS
+        call_status.error_buf = _bindings.RustBuffer(0, 0, None)
+        nbytes = status_copy.error_buf.len
+        lift_start = time.perf_counter_ns()
+        stats.phases["check"].record(lift_start - called)
+        try:
+            _bindings.uniffi_check_call_status(error_ffi_converter, status_copy)
+        finally:
+            self.record_phase(name, "lift", lift_start, nbytes)
+
+    def count_buffer(self, operation, nbytes):
+        buffers = self._thread_stats().buffers
+        buffers[operation] += 1
+        buffers[operation + "_bytes"] += nbytes
+
+    def snapshot(self):
+        """
+        Return the merged counters of all threads as plain dicts.
+        """
+        with self._lock:
+            threads = list(self._threads)
+        functions = {}
+        buffers = dict.fromkeys(self.BUFFER_COUNTERS, 0)
+        for thread in threads:
+            for key, value in list(thread.buffers.items()):
+                buffers[key] += value
+            for name, stats in list(thread.functions.items()):
+                merged = functions.setdefault(name, {
+                    "calls": 0,
+                    "errors": 0,
+                    "panics": 0,
+                    "bytes_lowered": 0,
+                    "bytes_lifted": 0,
+                    "latency": {phase: _UniFfiHistogram() for phase in self.PHASES},
+                })
+                for key in ("calls", "errors", "panics", "bytes_lowered", "bytes_lifted"):
+                    merged[key] += getattr(stats, key)
+                for phase, histogram in stats.phases.items():
+                    total = merged["latency"][phase]
+                    total.count += histogram.count
+                    total.total_ns += histogram.total_ns
+                    total.buckets = [a + b for a, b in zip(total.buckets, histogram.buckets)]
+        for merged in functions.values():
+            merged["latency"] = {phase: h.snapshot() for phase, h in merged["latency"].items()}
+        return {"functions": functions, "buffers": buffers}
+
+    def reset(self):
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.functions.clear()
+            for key in thread.buffers:
+                thread.buffers[key] = 0
+
+    def export(self):
+        """
+        Pass a snapshot to the exporter callback, if there is one.
+        """
+        if self.exporter is not None:
+            self.exporter(self.snapshot())
+
+    def start_exporting(self, interval):
+        """
+        Call `export()` every `interval` seconds from a daemon thread, until `close()`.
+        """
+        self._export_interval = interval
+        stop = self._stop_exporting = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.export()
+
+        threading.Thread(target=run, name="uniffi-instrumentation", daemon=True).start()
+
+    def close(self):
+        if self._stop_exporting is not None:
+            self._stop_exporting.set()
+            self._stop_exporting = None
+
+    def _after_fork(self):
+        # A forked child starts counting from zero, and needs its own export thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []
+        if self._stop_exporting is not None:
+            self.start_exporting(self._export_interval)
+
+def uniffi_enable_instrumentation(exporter=None, export_interval=None):
+    """
+    Install a new UniFfiInstrumentation, replacing any previous one, and return it.
+
+    With `export_interval`, `exporter` is called with a snapshot every that many seconds.
+    """
+    uniffi_disable_instrumentation()
+    instrumentation = UniFfiInstrumentation(exporter)
+    if export_interval is not None:
+        instrumentation.start_exporting(export_interval)
+    _bindings._uniffi_instrumentation = instrumentation
+    return instrumentation
+
+def uniffi_disable_instrumentation():
+    instrumentation = _bindings._uniffi_instrumentation
+    _bindings._uniffi_instrumentation = None
+    if instrumentation is not None:
+        instrumentation.close()
+
+# Rust tasks by function pointer.  There are only a few distinct ones (the future poll
+# functions), so this saves creating a ctypes function pointer per task.
+_uniffi_rust_tasks = {}
+
+def _uniffi_rust_task(task_ptr):
+    task = _uniffi_rust_tasks.get(task_ptr)
+    if task is None:
+        task = _uniffi_rust_tasks[task_ptr] = _bindings.UNIFFI_RUST_TASK(task_ptr)
+    return task
+
+def _uniffi_run_rust_tasks(eventloop, tasks):
+    for task_ptr, delay, task_data in tasks:
+        if delay == 0:
+            _uniffi_rust_task(task_ptr)(task_data)
+        else:
+            eventloop.call_later(delay / 1000.0, _uniffi_rust_task(task_ptr), task_data)
+
+@ctypes.CFUNCTYPE(None, ctypes.py_object)
+def _uniffi_report_callback_error(exc):
+    # Raising through a ctypes callback has ctypes pass `exc` to sys.unraisablehook, exactly
+    # like it does for exceptions raised by the direct callback
+    raise exc
+
+class UniFfiBatchedCallbacks:
+    """
+    Delivers foreign executor callbacks to the event loops in batches.
+
+    With the direct callback, every task Rust schedules takes the GIL on the Rust thread and
+    wakes up the event loop on its own.  Instead, Rust threads queue their callbacks without
+    entering Python, and a consumer thread takes them from the queue up to `max_batch` at a
+    time, waiting up to `max_latency` seconds for a batch to fill, with the GIL released.  Each
+    batch then takes the GIL once, and wakes up each event loop once with all of its tasks.
+    """
+
+    # How long the consumer thread waits in Rust for callbacks before checking in again
+    WAIT_MS = 1000
+
+    def __init__(self, max_batch=256, max_latency=0.001):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.batches = 0
+        self.callbacks = 0
+        self.errors = 0
+        self._entries = (_bindings._UniFfiQueuedCallback * max_batch)()
+        self._thread = None
+        self._closing = False
+
+    def start(self):
+        """
+        Open the queue, start the consumer thread and make Rust queue its callbacks.
+        """
+        self._closing = False
+        # No forward callback (a null function pointer) while the queue is open
+        _bindings.rust_call(_bindings._UniFFILib.ffi_UniffiCustomBug_callback_queue_set_closed, 0, _bindings.UNIFFI_FOREIGN_EXECUTOR_CALLBACK_T())
+        self._start_thread()
+        push = ctypes.cast(_bindings._UniFFILib.ffi_UniffiCustomBug_callback_queue_push, _bindings.UNIFFI_FOREIGN_EXECUTOR_CALLBACK_T)
+        _bindings._UniFFILib.uniffi_foreign_executor_callback_set(push)
+
+    def _start_thread(self):
+        self._thread = threading.Thread(target=self._run, name="uniffi-callbacks", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        linger_us = int(self.max_latency * 1e6)
+        while True:
+            # The GIL is released while this waits
+            count = _bindings.rust_call(
+                _bindings._UniFFILib.ffi_UniffiCustomBug_callback_queue_drain,
+                self._entries, self.max_batch, self.WAIT_MS, linger_us,
+            )
+            if count:
+                try:
+                    self.dispatch(self._entries, count)
+                except Exception as e:
+                    # Keep draining: nothing else would, and Rust keeps queueing
+                    self.errors += 1
+                    _uniffi_report_callback_error(e)
+            elif self._closing:
+                return
+
+    def dispatch(self, entries, count):
+        """
+        Schedule the first `count` queued callbacks in `entries` on their event loops.
+        """
+        pointers = _bindings.FfiConverterForeignExecutor._pointer_manager
+        # executor -> (event loop, [(task, delay, task_data)])
+        batches = {}
+        done = []
+        for i in range(count):
+            entry = entries[i]
+            executor = entry.executor
+            if entry.task is None:
+                # Rust dropped the ForeignExecutor.  Its handle may be reused by the next
+                # entries, so set aside what it has scheduled so far.
+                if executor in batches:
+                    done.append(batches.pop(executor))
+                try:
+                    pointers.release_pointer(executor)
+                except KeyError:
+                    # An event loop of the parent process, after a fork
+                    pass
+                continue
+            batch = batches.get(executor)
+            if batch is None:
+                try:
+                    batch = batches[executor] = (pointers.lookup(executor), [])
+                except KeyError:
+                    continue
+            batch[1].append((entry.task, entry.delay, entry.task_data))
+        done.extend(batches.values())
+        for eventloop, tasks in done:
+            try:
+                eventloop.call_soon_threadsafe(_uniffi_run_rust_tasks, eventloop, tasks)
+            except Exception as e:
+                # E.g. the loop has been closed.  Its tasks are dropped, as they would be by
+                # the direct callback, and the other loops still get theirs.
+                self.errors += 1
+                _uniffi_report_callback_error(e)
+        self.batches += 1
+        self.callbacks += count
+
+    def close(self):
+        """
+        Switch Rust back to the direct callback, then deliver what's still queued and stop.
+
+        Rust threads that still call the queueing callback after this (because they looked it
+        up before the switch) are forwarded to the direct callback by the closed queue.
+        """
+        _bindings._UniFFILib.uniffi_foreign_executor_callback_set(_bindings.uniffi_foreign_executor_callback)
+        self._closing = True
+        _bindings.rust_call(_bindings._UniFFILib.ffi_UniffiCustomBug_callback_queue_set_closed, 1, _bindings.uniffi_foreign_executor_callback)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # Whatever the consumer thread didn't get to, e.g. if it was never restarted after a
+        # fork.  Drain doesn't wait once the queue is closed.
+        self._run()
+
+    def _after_fork(self):
+        # The consumer thread didn't survive the fork, and neither did threads that may have
+        # held the queue's lock, so start over with a new queue
+        _bindings.rust_call(_bindings._UniFFILib.ffi_UniffiCustomBug_callback_queue_reset)
+        self._closing = False
+        self._start_thread()
+
+def uniffi_enable_batched_callbacks(**options):
+    """
+    Install a new UniFfiBatchedCallbacks, replacing any previous one, and return it.
+    """
+    uniffi_disable_batched_callbacks()
+    callbacks = UniFfiBatchedCallbacks(**options)
+    callbacks.start()
+    _bindings._uniffi_batched_callbacks = callbacks
+    return callbacks
+
+def uniffi_disable_batched_callbacks():
+    callbacks = _bindings._uniffi_batched_callbacks
+    _bindings._uniffi_batched_callbacks = None
+    if callbacks is not None:
+        callbacks.close()
+
+def _uniffi_copy_exception(error):
+    # A copy of `error` with the same type and traceback, or, for exceptions that can't be
+    # copied, an InternalError chained to it
+    import copy
+    try:
+        copied = copy.copy(error)
+    except Exception:
+        copied = None
+    if type(copied) is not type(error) or copied is error:
+        copied = _bindings.InternalError("test_fn_many batch failed: {!r}".format(error))
+        copied.__cause__ = error
+        return copied
+    copied.__cause__ = error.__cause__
+    copied.__context__ = error.__context__
+    return copied.with_traceback(error.__traceback__)
+
+class _UniFfiLoopBatches:
+    """
+    The calls of one event loop waiting for a batch, and the batches it has in flight.
+
+    This is the value of a WeakKeyDictionary keyed by the loop, so it must not refer to it.
+    """
+
+    __slots__ = ("pending", "timer", "in_flight")
+
+    def __init__(self):
+        # future -> (value, time it was submitted in ns), in submission order
+        self.pending = {}
+        self.timer = None
+        self.in_flight = 0
+
+class UniFfiAsyncBatcher:
+    """
+    Coalesces concurrent `test_fn_async` calls into `test_fn_many` calls.
+
+    Calls made on an event loop within `window` seconds of the first pending one are lowered
+    into one buffer and passed to Rust in a single FFI call on the blocking executor, as soon
+    as the window is over or `max_batch` calls are pending.  At most `max_in_flight` batches
+    per event loop run at once; further calls wait for one of them to finish.  Each caller gets
+    the outcome of its own value, errors included.
+
+    This pays off for small values, where the per-call overhead dominates.  Large ones are
+    better off with plain calls, which lower them in parallel.
+
+    `snapshot()` returns the distribution of batch sizes and of the time calls waited for
+    their batch to be dispatched, in power-of-two buckets.
+    """
+
+    def __init__(self, window=0.001, max_batch=256, max_in_flight=4):
+        if max_batch < 1 or max_in_flight < 1:
+            raise ValueError("max_batch and max_in_flight must be at least 1")
+        self.window = window
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+        self._loops = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._batch_sizes = _UniFfiHistogram()
+        self._queue_delay = _UniFfiHistogram()
+
+    def submit(self, value):
+        """
+        Queue a `test_fn` call with `value` on the running event loop and return its future.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        # Event loops of other threads submit concurrently
+        with self._lock:
+            batches = self._loops.get(loop)
+            if batches is None:
+                batches = self._loops[loop] = _UniFfiLoopBatches()
+        future = loop.create_future()
+        future.add_done_callback(lambda future: self._discard_cancelled(batches, future))
+        batches.pending[future] = (value, time.perf_counter_ns())
+        if len(batches.pending) >= self.max_batch:
+            self._dispatch(batches)
+        elif batches.timer is None:
+            batches.timer = loop.call_later(self.window, self._dispatch, batches)
+        return future
+
+    def _dispatch(self, batches):
+        if batches.timer is not None:
+            batches.timer.cancel()
+            batches.timer = None
+        # Anything left over is dispatched by `_resolve` when an in-flight batch finishes
+        while batches.pending and batches.in_flight < self.max_in_flight:
+            taken = list(itertools.islice(batches.pending.items(), self.max_batch))
+            for future, _ in taken:
+                del batches.pending[future]
+            # A future's done callback runs after it's cancelled, it may still have been pending
+            batch = [(value, future, submitted) for future, (value, submitted) in taken if not future.cancelled()]
+            if not batch:
+                continue
+            now = time.perf_counter_ns()
+            with self._lock:
+                self._batch_sizes.record(len(batch))
+                for _, _, submitted in batch:
+                    self._queue_delay.record(now - submitted)
+            batches.in_flight += 1
+            task = _bindings._uniffi_run_blocking(_bindings._uniffi_test_fn_batch, [value for value, _, _ in batch])
+            task.add_done_callback(lambda task, batch=batch: self._resolve(batches, batch, task))
+
+    def _discard_cancelled(self, batches, future):
+        # Pending futures refer to their loop: drop cancelled ones right away, or the calls
+        # left over when a loop is shut down would keep it alive
+        if not future.cancelled():
+            return
+        batches.pending.pop(future, None)
+        if not batches.pending and batches.timer is not None:
+            batches.timer.cancel()
+            batches.timer = None
+
+    def _resolve(self, batches, batch, task):
+        batches.in_flight -= 1
+        try:
+            errors = task.result()
+        except BaseException as e:
+            # Every caller gets its own exception: they each add to its traceback
+            errors = [_uniffi_copy_exception(e) for _ in batch]
+        for (_, future, _), error in zip(batch, errors):
+            if future.cancelled():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+        if batches.pending:
+            self._dispatch(batches)
+
+    def snapshot(self):
+        with self._lock:
+            batch_sizes = self._batch_sizes.snapshot()
+            queue_delay = self._queue_delay.snapshot()
+        batch_sizes["total"] = batch_sizes.pop("total_ns")
+        return {"batch_size": batch_sizes, "queue_delay_ns": queue_delay}
+
+    def reset(self):
+        with self._lock:
+            self._batch_sizes = _UniFfiHistogram()
+            self._queue_delay = _UniFfiHistogram()
+
+    def _after_fork(self):
+        # The parent's event loops and pending calls don't carry over
+        self._loops = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+def uniffi_enable_async_batching(**options):
+    """
+    Install a new UniFfiAsyncBatcher for `test_fn_async`, replacing any previous one, and
+    return it.
+    """
+    _bindings._uniffi_async_batcher = UniFfiAsyncBatcher(**options)
+    return _bindings._uniffi_async_batcher
+
+def uniffi_disable_async_batching():
+    # Calls already queued are still dispatched by the previous batcher
+    _bindings._uniffi_async_batcher = None
+
+class _UniFfiSharedBatch:
+    """
+    A shared memory segment holding the payloads of several pool calls.
+
+    It's unlinked once the last of those calls is done.
+    """
+
+    def __init__(self, segment, count):
+        self.segment = segment
+        self._pending = count
+        self._lock = threading.Lock()
+
+    def call_done(self, future):
+        with self._lock:
+            self._pending -= 1
+            done = self._pending == 0
+        if done:
+            self.segment.close()
+            self.segment.unlink()
+
+class UniFfiProcessPool:
+    """
+    Run `test_fn` calls in a pool of worker processes.
+
+    Each worker loads the library once.  Payloads aren't pickled: they are copied once into
+    a `multiprocessing.shared_memory` segment, and workers only receive the segment name and
+    the payload's offset and size.  Workers call Rust on the shared memory directly through
+    the borrowed path (see `test_fn_borrowed`).  Errors are raised from the calls' futures.
+
+    Payloads are packed into segments of up to `segment_size` bytes, a larger payload gets a
+    segment of its own.
+    """
+
+    def __init__(self, processes=None, mp_context=None, segment_size=64 * 1024 * 1024):
+        import concurrent.futures
+
+        self.segment_size = segment_size
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=mp_context,
+            initializer=_bindings._uniffi_process_pool_init,
+        )
+
+    def submit(self, type_param):
+        """
+        Schedule `test_fn(type_param)` and return its `concurrent.futures.Future`.
+        """
+        return self.submit_many([type_param])[0]
+
+    def submit_many(self, type_params):
+        """
+        Schedule `test_fn` for each value of `type_params` and return their futures, in order.
+        """
+        futures = []
+        batch = []
+        batch_size = 0
+        for type_param in type_params:
+            view = self._to_view(type_param)
+            if batch and batch_size + view.nbytes > self.segment_size:
+                futures.extend(self._submit_batch(batch, batch_size))
+                batch = []
+                batch_size = 0
+            batch.append(view)
+            batch_size += view.nbytes
+        if batch:
+            futures.extend(self._submit_batch(batch, batch_size))
+        return futures
+
+    def map(self, type_params):
+        """
+        Call `test_fn` for each value of `type_params` in the pool and wait for all of them.
+
+        Raises the error of the first failed call, if any.
+        """
+        for future in self.submit_many(type_params):
+            future.result()
+
+    @staticmethod
+    def _to_view(type_param):
+        try:
+            return memoryview(type_param).cast("B")
+        except TypeError:
+            raise TypeError("a bytes-like object is required, not {!r}".format(type(type_param).__name__))
+
+    def _submit_batch(self, views, size):
+        from multiprocessing import shared_memory
+
+        segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        batch = _UniFfiSharedBatch(segment, len(views))
+        futures = []
+        offset = 0
+        try:
+            for view in views:
+                segment.buf[offset:offset + view.nbytes] = view
+                offset += view.nbytes
+        except:
+            segment.close()
+            segment.unlink()
+            raise
+        offset = 0
+        for index, view in enumerate(views):
+            try:
+                future = self._executor.submit(_bindings._uniffi_process_pool_test_fn, segment.name, offset, view.nbytes)
+            except:
+                # Account for the calls that won't be submitted
+                for _ in range(len(views) - index):
+                    batch.call_done(None)
+                raise
+            future.add_done_callback(batch.call_done)
+            futures.append(future)
+            offset += view.nbytes
+        return futures
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
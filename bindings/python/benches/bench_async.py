@@ -0,0 +1,59 @@
+"""
+Concurrent `test_fn_async` calls per second from a single event loop.
+
+Compares the loop's default executor with dedicated thread pools of a few sizes, and with
+calls coalesced by `uniffi_enable_async_batching`:
+
+    python bindings/python/benches/bench_async.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import UniffiCustomBug  # noqa: E402
+
+SIZES = [16, 4096, 1 << 20]
+WORKERS = [None, 1, 2, 4, 8]
+BATCH_SIZES = [16, 64, 256]
+CONCURRENCY = 64
+MIN_TIME = 0.5
+
+
+async def bench(size):
+    payload = os.urandom(size)
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < MIN_TIME:
+        await asyncio.gather(*(UniffiCustomBug.test_fn_async(payload) for _ in range(CONCURRENCY)))
+        calls += CONCURRENCY
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    print("{:>10}  {:>10}  {:>12}".format("workers", "size", "calls/s"))
+    for workers in WORKERS:
+        UniffiCustomBug.uniffi_set_blocking_executor(max_workers=workers)
+        for size in SIZES:
+            rate = asyncio.run(bench(size))
+            print("{:>10}  {:>10}  {:>12.0f}".format(workers or "default", size, rate))
+    UniffiCustomBug.uniffi_set_blocking_executor(None)
+
+    print("{:>10}  {:>10}  {:>12}  {:>10}  {:>14}".format("max_batch", "size", "calls/s", "batches", "mean wait us"))
+    for max_batch in BATCH_SIZES:
+        batcher = UniffiCustomBug.uniffi_enable_async_batching(max_batch=max_batch)
+        for size in SIZES:
+            batcher.reset()
+            rate = asyncio.run(bench(size))
+            stats = batcher.snapshot()
+            delay = stats["queue_delay_ns"]
+            print("{:>10}  {:>10}  {:>12.0f}  {:>10}  {:>14.1f}".format(
+                max_batch, size, rate, stats["batch_size"]["count"], delay["total_ns"] / max(delay["count"], 1) / 1e3))
+    UniffiCustomBug.uniffi_disable_async_batching()
+
+
+if __name__ == "__main__":
+    main()
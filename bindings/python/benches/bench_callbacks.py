@@ -0,0 +1,80 @@
+"""
+Foreign executor callbacks per second from native threads, direct and batched.
+
+The C stand-in's `standin_fire_callbacks` calls the registered foreign executor callback from
+several native threads, the way Rust threads wake up futures, with a task that only counts how
+often it ran.  Reports how many of those tasks per second get to run on an asyncio event loop,
+with the direct callback and with UniFfiBatchedCallbacks:
+
+    python bindings/python/benches/bench_callbacks.py
+"""
+
+import argparse
+import asyncio
+import ctypes
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import suite  # noqa: E402
+
+THREADS = [1, 4, 16]
+CALLBACKS_PER_THREAD = 20000
+
+
+def bench(lib, executor, threads, count):
+    expected = lib.standin_tasks_run() + threads * count
+    start = time.perf_counter()
+    lib.standin_fire_callbacks(executor, threads, count)
+    while lib.standin_tasks_run() < expected:
+        time.sleep(0.0005)
+    return threads * count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=THREADS)
+    parser.add_argument("--count", type=int, default=CALLBACKS_PER_THREAD, help="callbacks per thread")
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[64, 256, 1024])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        os.environ["UNIFFI_CUSTOM_BUG_LIBRARY_PATH"] = suite.build_standin(build_dir)
+        sys.path.insert(0, suite.BINDINGS_DIR)
+        import UniffiCustomBug as U
+
+        lib = U._UniFFILib
+        lib.standin_fire_callbacks.argtypes = (ctypes.c_size_t, ctypes.c_int32, ctypes.c_int32)
+        lib.standin_fire_callbacks.restype = None
+        lib.standin_tasks_run.argtypes = ()
+        lib.standin_tasks_run.restype = ctypes.c_int64
+
+        eventloop = asyncio.new_event_loop()
+        runner = threading.Thread(target=eventloop.run_forever, daemon=True)
+        runner.start()
+        executor = U.FfiConverterForeignExecutor.lower(eventloop)
+
+        print("{:>16}  {:>8}  {:>12}  {:>10}".format("mode", "threads", "tasks/s", "batches"))
+        lib.uniffi_foreign_executor_callback_set(U.uniffi_foreign_executor_callback)
+        for threads in args.threads:
+            rate = bench(lib, executor, threads, args.count)
+            print("{:>16}  {:>8}  {:>12.0f}  {:>10}".format("direct", threads, rate, "-"))
+        for max_batch in args.max_batch:
+            callbacks = U.uniffi_enable_batched_callbacks(max_batch=max_batch)
+            for threads in args.threads:
+                batches = callbacks.batches
+                rate = bench(lib, executor, threads, args.count)
+                mode = "batched/{}".format(max_batch)
+                print("{:>16}  {:>8}  {:>12.0f}  {:>10}".format(mode, threads, rate, callbacks.batches - batches))
+            U.uniffi_disable_batched_callbacks()
+
+        eventloop.call_soon_threadsafe(eventloop.stop)
+        runner.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Frames and latency of the specialized CustomType lowering/lifting against the converter chain.
+
+    python bindings/python/benches/bench_flattened.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import UniffiCustomBug  # noqa: E402
+
+SIZES = [16, 1024, 64 * 1024, 1024 * 1024]
+NUMBER = 2000
+
+
+def count_frames(func, *args):
+    frames = 0
+
+    def profile(frame, event, arg):
+        nonlocal frames
+        if event == "call":
+            frames += 1
+
+    sys.setprofile(profile)
+    try:
+        func(*args)
+    finally:
+        sys.setprofile(None)
+    return frames
+
+
+def main():
+    U = UniffiCustomBug
+    chain = (U.FfiConverterTypeCustomType.lower, U.FfiConverterTypeCustomType.lift)
+    flat = (U._uniffi_lower_CustomType, U._uniffi_lift_CustomType)
+    payload = os.urandom(16)
+    print("python frames per value:")
+    for name, (lower, lift) in (("chain", chain), ("flattened", flat)):
+        rbuf = lower(payload)
+        lower_frames = count_frames(lambda: lower(payload).free())
+        lift_frames = count_frames(lift, rbuf)
+        print("  {:<10} lower {:>3}  lift {:>3}".format(name, lower_frames, lift_frames))
+
+    print("{:>10}  {:>10}  {:>12}  {:>12}".format("path", "size", "lower ns", "roundtrip ns"))
+    for size in SIZES:
+        payload = os.urandom(size)
+        for name, (lower, lift) in (("chain", chain), ("flattened", flat)):
+            lower_ns = min(timeit.repeat(lambda: lower(payload).free(), number=NUMBER, repeat=3)) / NUMBER * 1e9
+            roundtrip_ns = min(timeit.repeat(lambda: lift(lower(payload)), number=NUMBER // 10, repeat=3)) / (NUMBER // 10) * 1e9
+            print("{:>10}  {:>10}  {:>12.0f}  {:>12.0f}".format(name, size, lower_ns, roundtrip_ns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Worker spawn latency and per-worker memory of a prefork server, with and without preloading.
+
+Each mode runs in a fresh interpreter that forks WORKERS children, one at a time.  A child
+counts as ready after its first `test_fn` call; the time from `fork()` to then is the spawn
+latency.  Memory is the child's private (not shared with the parent) RSS at that point.
+
+- `import`: the parent doesn't import the bindings, each worker does
+- `lazy`: the parent imports them with UNIFFI_CUSTOM_BUG_LAZY_LOAD=1, each worker loads the library
+- `preload`: the parent imports them and calls `uniffi_preload()`
+
+    python bindings/python/benches/bench_fork.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+BINDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODES = ["import", "lazy", "preload"]
+WORKERS = 20
+
+
+def private_rss_kib():
+    # Private_Clean + Private_Dirty from smaps_rollup (Linux only)
+    total = 0
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Private_"):
+                    total += int(line.split()[1])
+    except OSError:
+        return None
+    return total
+
+
+def run_mode(mode):
+    sys.path.insert(0, BINDINGS_DIR)
+    if mode == "lazy":
+        os.environ["UNIFFI_CUSTOM_BUG_LAZY_LOAD"] = "1"
+    if mode in ("lazy", "preload"):
+        import UniffiCustomBug
+        if mode == "preload":
+            UniffiCustomBug.uniffi_preload()
+
+    latencies = []
+    memory = []
+    for _ in range(WORKERS):
+        read_fd, write_fd = os.pipe()
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            import UniffiCustomBug
+            UniffiCustomBug.test_fn(b"ready")
+            elapsed = time.perf_counter() - start
+            os.write(write_fd, json.dumps([elapsed, private_rss_kib()]).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            elapsed, rss = json.loads(f.read())
+        os.waitpid(pid, 0)
+        latencies.append(elapsed)
+        memory.append(rss)
+    latencies.sort()
+    print(json.dumps({
+        "median_ms": latencies[len(latencies) // 2] * 1e3,
+        "max_ms": latencies[-1] * 1e3,
+        "private_kib": None if memory[0] is None else sorted(memory)[len(memory) // 2],
+    }))
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--mode":
+        run_mode(sys.argv[2])
+        return
+    print("{:>8}  {:>12}  {:>10}  {:>14}".format("mode", "median ms", "max ms", "private KiB"))
+    for mode in MODES:
+        output = subprocess.run([sys.executable, __file__, "--mode", mode], check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        print("{:>8}  {:>12.2f}  {:>10.2f}  {:>14}".format(mode, result["median_ms"], result["max_ms"], result["private_kib"]))
+
+
+if __name__ == "__main__":
+    main()
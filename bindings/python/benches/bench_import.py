@@ -0,0 +1,57 @@
+"""
+Import time of the bindings: eager, UNIFFI_CUSTOM_BUG_LAZY_LOAD=1 and with the checksum cache.
+
+Each configuration is imported in fresh interpreters under `python -X importtime` and the median
+cumulative time of the `UniffiCustomBug` module is reported:
+
+    python bindings/python/benches/bench_import.py
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BINDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+RUNS = 20
+
+
+def import_time_us(env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import UniffiCustomBug"],
+        cwd=BINDINGS_DIR,
+        env=env,
+        stderr=subprocess.PIPE,
+        check=True,
+        text=True,
+    )
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == "UniffiCustomBug":
+            return int(fields[1])
+    raise RuntimeError("UniffiCustomBug missing from -X importtime output")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        run(cache_dir)
+
+
+def run(cache_dir):
+    configurations = {
+        "eager": {"UNIFFI_CUSTOM_BUG_LAZY_LOAD": "0", "UNIFFI_CUSTOM_BUG_CACHE_DIR": ""},
+        "lazy": {"UNIFFI_CUSTOM_BUG_LAZY_LOAD": "1", "UNIFFI_CUSTOM_BUG_CACHE_DIR": ""},
+        "eager, checksum cache": {"UNIFFI_CUSTOM_BUG_LAZY_LOAD": "0", "UNIFFI_CUSTOM_BUG_CACHE_DIR": cache_dir},
+    }
+    for name, overrides in configurations.items():
+        env = dict(os.environ, **overrides)
+        # Measure with cached bytecode, like a deployed module
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        import_time_us(env)
+        times = [import_time_us(env) for _ in range(RUNS)]
+        print("{:<26} {:>8.0f} us (median of {})".format(name, statistics.median(times), RUNS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+`test_fn` calls per second with repeated arguments, with and without the lower cache.
+
+Each call picks one of a small set of immutable values, the way configuration blobs or model
+keys get passed over and over:
+
+    python bindings/python/benches/bench_lower_cache.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import UniffiCustomBug  # noqa: E402
+
+SIZES = [64, 4096, 256 * 1024, 4 * 1024 * 1024]
+DISTINCT = 16
+MIN_TIME = 0.5
+
+
+def bench(values):
+    rng = random.Random(0)
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < MIN_TIME:
+        for _ in range(100):
+            UniffiCustomBug.test_fn(rng.choice(values))
+        calls += 100
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    print("{:>10}  {:>12}  {:>12}  {:>8}  {:>12}".format("size", "uncached/s", "cached/s", "hit rate", "held bytes"))
+    for size in SIZES:
+        values = [os.urandom(size) for _ in range(DISTINCT)]
+        UniffiCustomBug.uniffi_disable_lower_cache()
+        uncached = bench(values)
+        cache = UniffiCustomBug.uniffi_enable_lower_cache()
+        cached = bench(values)
+        stats = cache.stats()
+        UniffiCustomBug.uniffi_disable_lower_cache()
+        print("{:>10}  {:>12.0f}  {:>12.0f}  {:>8.1%}  {:>12}".format(size, uncached, cached, stats["hit_rate"], stats["held_bytes"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Lowering throughput of `FfiConverterBytes` through `RustBufferBuilder`.
+
+Run from the repository root once `libuniffi_custom_bug.so` sits next to the bindings:
+
+    python bindings/python/benches/bench_lowering.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import UniffiCustomBug  # noqa: E402
+
+SIZES = [16 << (2 * i) for i in range(12)]  # 16 B .. 64 MiB
+MIN_TIME = 0.2
+
+
+def bench_lower(size):
+    payload = os.urandom(size)
+    lower = UniffiCustomBug.FfiConverterBytes.lower
+    iterations = 0
+    start = time.perf_counter()
+    while True:
+        lower(payload).free()
+        iterations += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME:
+            return size * iterations / elapsed / 1e6, elapsed / iterations
+
+
+def main():
+    print("{:>12}  {:>12}  {:>12}".format("size", "MB/s", "us/call"))
+    for size in SIZES:
+        mbps, seconds = bench_lower(size)
+        print("{:>12}  {:>12.1f}  {:>12.2f}".format(size, mbps, seconds * 1e6))
+
+
+if __name__ == "__main__":
+    main()
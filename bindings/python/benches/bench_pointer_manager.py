@@ -0,0 +1,102 @@
+"""
+Handle churn through the pointer managers from several threads.
+
+Each operation is what a callback or future costs: one `new_pointer`, a few `lookup`s and
+one `release_pointer`, with a few handles kept alive per thread.  Runs on any interpreter; the
+CPython manager is only measured on CPython:
+
+    python bindings/python/benches/bench_pointer_manager.py
+    pypy3 bindings/python/benches/bench_pointer_manager.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ.setdefault("UNIFFI_CUSTOM_BUG_LAZY_LOAD", "1")
+import UniffiCustomBug  # noqa: E402
+
+THREADS = [1, 2, 4, 8, 16]
+LOOKUPS = 4
+LIVE = 64
+MIN_TIME = 0.5
+
+
+class SingleLockPointerManager:
+    """The previous UniFfiPointerManagerGeneral, as a baseline."""
+
+    def __init__(self):
+        self._map = {}
+        self._lock = threading.Lock()
+        self._current_handle = 0
+
+    def new_pointer(self, obj):
+        with self._lock:
+            handle = self._current_handle
+            self._current_handle += 1
+            self._map[handle] = obj
+        return handle
+
+    def release_pointer(self, handle):
+        with self._lock:
+            return self._map.pop(handle)
+
+    def lookup(self, handle):
+        with self._lock:
+            return self._map[handle]
+
+
+def churn(manager, stop, counts, index):
+    obj = object()
+    live = [manager.new_pointer(obj) for _ in range(LIVE)]
+    count = 0
+    while not stop.is_set():
+        handle = manager.new_pointer(obj)
+        for _ in range(LOOKUPS):
+            manager.lookup(handle)
+        live.append(handle)
+        manager.release_pointer(live.pop(0))
+        count += 1
+    for handle in live:
+        manager.release_pointer(handle)
+    counts[index] = count
+
+
+def bench(manager, threads):
+    counts = [0] * threads
+    stop = threading.Event()
+    workers = [threading.Thread(target=churn, args=(manager, stop, counts, i)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    time.sleep(MIN_TIME)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main():
+    managers = [
+        ("single-lock", SingleLockPointerManager),
+        ("sharded", UniffiCustomBug.UniFfiPointerManagerGeneral),
+    ]
+    if sys.implementation.name == "cpython":
+        managers.append(("cpython", UniffiCustomBug.UniFfiPointerManagerCPython))
+    print(sys.implementation.name)
+    print("{:>12}  {:>8}  {:>14}".format("manager", "threads", "handles/s"))
+    for name, cls in managers:
+        for threads in THREADS:
+            manager = cls()
+            rate = bench(manager, threads)
+            print("{:>12}  {:>8}  {:>14.0f}".format(name, threads, rate))
+            live = getattr(manager, "live_count", None)
+            if live is not None:
+                assert live() == 0, live()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Throughput of `test_fn` through UniFfiProcessPool for 1-N worker processes.
+
+Compares against a plain loop in the driver process.  Payloads reach the workers through
+shared memory:
+
+    python bindings/python/benches/bench_process_pool.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import UniffiCustomBug  # noqa: E402
+
+SIZES = [64 * 1024, 4 * 1024 * 1024]
+CALLS = 64
+
+
+def processes():
+    count = os.cpu_count() or 1
+    result = [1]
+    while result[-1] * 2 <= count:
+        result.append(result[-1] * 2)
+    if result[-1] != count:
+        result.append(count)
+    return result
+
+
+def bench(run, payloads):
+    run(payloads)
+    start = time.perf_counter()
+    run(payloads)
+    return len(payloads) / (time.perf_counter() - start)
+
+
+def main():
+    print("{:>10}  {:>10}  {:>12}  {:>10}".format("processes", "size", "calls/s", "MB/s"))
+    for size in SIZES:
+        payloads = [os.urandom(size) for _ in range(CALLS)]
+        rate = bench(lambda values: [UniffiCustomBug.test_fn(v) for v in values], payloads)
+        print("{:>10}  {:>10}  {:>12.0f}  {:>10.1f}".format("in-process", size, rate, rate * size / 1e6))
+        for count in processes():
+            with UniffiCustomBug.UniFfiProcessPool(processes=count) as pool:
+                rate = bench(pool.map, payloads)
+            print("{:>10}  {:>10}  {:>12.0f}  {:>10.1f}".format(count, size, rate, rate * size / 1e6))
+
+
+if __name__ == "__main__":
+    main()
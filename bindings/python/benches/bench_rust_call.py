@@ -0,0 +1,39 @@
+"""
+Fixed per-call overhead of `rust_call` versus the prebound `test_fn` stub.
+
+The payloads are lowered up front, so only the call itself is timed:
+
+    python bindings/python/benches/bench_rust_call.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import UniffiCustomBug  # noqa: E402
+
+CALLS = 200_000
+
+
+def generic(rbuf):
+    UniffiCustomBug.rust_call(UniffiCustomBug._UniFFILib.uniffi_uniffi_custom_bug_fn_func_test_fn, rbuf)
+
+
+def run(name, call):
+    bufs = [UniffiCustomBug.FfiConverterBytes.lower(b"x") for _ in range(CALLS)]
+    start = time.perf_counter()
+    for rbuf in bufs:
+        call(rbuf)
+    elapsed = time.perf_counter() - start
+    print("{:<10} {:>8.0f} ns/call".format(name, elapsed / CALLS * 1e9))
+
+
+def main():
+    run("rust_call", generic)
+    run("stub", UniffiCustomBug._uniffi_call_test_fn)
+
+
+if __name__ == "__main__":
+    main()
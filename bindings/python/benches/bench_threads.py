@@ -0,0 +1,64 @@
+"""
+Thread scaling of `test_fn`, and of `test_fn_borrowed` which lends the bytes instead of copying them.
+
+Reports calls per second for 1, 2, 4, 8 and 16 threads and a few payload sizes:
+
+    python bindings/python/benches/bench_threads.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import UniffiCustomBug  # noqa: E402
+
+THREADS = [1, 2, 4, 8, 16]
+SIZES = [16, 4096, 256 * 1024, 4 * 1024 * 1024]
+MIN_TIME = 0.5
+
+
+def bench(function, payload, threads):
+    counts = [0] * threads
+    barrier = threading.Barrier(threads + 1)
+    stop = threading.Event()
+
+    def worker(index):
+        barrier.wait()
+        count = 0
+        while not stop.is_set():
+            for _ in range(10):
+                function(payload)
+            count += 10
+        counts[index] = count
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    time.sleep(MIN_TIME)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main():
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("{} {}, GIL {}, {} CPUs".format(
+        sys.implementation.name, sys.version.split()[0], "enabled" if gil else "disabled", os.cpu_count()))
+    print("{:>16}  {:>10}  {:>8}  {:>12}  {:>10}".format("function", "size", "threads", "calls/s", "MB/s"))
+    for function in (UniffiCustomBug.test_fn, UniffiCustomBug.test_fn_borrowed):
+        for size in SIZES:
+            payload = os.urandom(size)
+            for threads in THREADS:
+                rate = bench(function, payload, threads)
+                print("{:>16}  {:>10}  {:>8}  {:>12.0f}  {:>10.1f}".format(
+                    function.__name__, size, threads, rate, rate * size / 1e6))
+
+
+if __name__ == "__main__":
+    main()
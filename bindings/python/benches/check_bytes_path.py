@@ -0,0 +1,75 @@
+"""
+Check that CustomType values are lowered through the bulk `bytes` path.
+
+Lowering a 10 MiB payload one byte at a time (the `typing.List[int]` alias that uniffi 0.24
+can emit for `[Custom] typedef bytes`) takes seconds; the bytes path takes milliseconds.  Exits
+with status 1 if `test_fn` takes longer than the budget or the encoding isn't the bytes one:
+
+    python bindings/python/benches/check_bytes_path.py --standin
+"""
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import suite  # noqa: E402
+
+PAYLOAD_SIZE = 10 * 1024 * 1024
+
+
+def check(U, budget):
+    failures = []
+    if U.CustomType is not bytes:
+        failures.append("CustomType is {!r}, not bytes".format(U.CustomType))
+
+    payload = os.urandom(PAYLOAD_SIZE)
+    rbuf = U.FfiConverterTypeCustomType.lower(payload)
+    encoded = rbuf.asMemoryview().tobytes()
+    rbuf.free()
+    if encoded != struct.pack(">i", PAYLOAD_SIZE) + payload:
+        failures.append("FfiConverterTypeCustomType doesn't use the bytes encoding")
+
+    try:
+        U.FfiConverterTypeCustomType.lower([0, 1, 2]).free()
+        failures.append("FfiConverterTypeCustomType accepts a list of ints")
+    except TypeError:
+        pass
+
+    U.test_fn(payload)
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        U.test_fn(payload)
+        best = min(best, time.perf_counter() - start)
+    print("test_fn({} MiB): {:.1f} ms (budget {:.0f} ms)".format(PAYLOAD_SIZE >> 20, best * 1e3, budget * 1e3))
+    if best > budget:
+        failures.append("test_fn took {:.1f} ms, over the {:.0f} ms budget".format(best * 1e3, budget * 1e3))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--standin", action="store_true", help="check against the C stand-in library")
+    parser.add_argument("--budget", type=float, default=0.1, help="seconds allowed for one test_fn call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        if args.standin:
+            os.environ["UNIFFI_CUSTOM_BUG_LIBRARY_PATH"] = suite.build_standin(build_dir)
+        sys.path.insert(0, suite.BINDINGS_DIR)
+        import UniffiCustomBug
+
+        failures = check(UniffiCustomBug, args.budget)
+
+    for failure in failures:
+        print("FAIL: " + failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
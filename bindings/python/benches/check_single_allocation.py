@@ -0,0 +1,79 @@
+"""
+Check that lowering common argument shapes allocates each RustBuffer exactly once.
+
+Lowers strings, byte strings, CustomType values and numeric sequences of several sizes with
+instrumentation enabled, and exits with status 1 if any of them needed `rustbuffer_reserve`:
+
+    python bindings/python/benches/check_single_allocation.py --standin
+"""
+
+import argparse
+import array
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import suite  # noqa: E402
+
+SIZES = [0, 1, 15, 16, 17, 4096, 10 * 1024 * 1024]
+
+
+def shapes(U, size):
+    payload = os.urandom(size)
+    yield "FfiConverterString/{}".format(size), U.FfiConverterString, "x" * size
+    yield "FfiConverterBytes/{}".format(size), U.FfiConverterBytes, payload
+    yield "FfiConverterBytes/bytearray/{}".format(size), U.FfiConverterBytes, bytearray(payload)
+    yield "FfiConverterTypeCustomType/{}".format(size), U.FfiConverterTypeCustomType, payload
+    yield "CustomType/flattened/{}".format(size), None, payload
+    if size <= 4096:
+        yield "FfiConverterSequenceInt32/list/{}".format(size), U.FfiConverterSequenceInt32, list(range(size))
+        yield "FfiConverterSequenceInt32/iterator/{}".format(size), U.FfiConverterSequenceInt32, iter(range(size))
+        yield "FfiConverterSequenceDouble/array/{}".format(size), U.FfiConverterSequenceDouble, array.array("d", range(size))
+        yield "FfiConverterSequenceUInt8/bytes/{}".format(size), U.FfiConverterSequenceUInt8, payload
+    numpy = sys.modules.get("numpy")
+    if numpy is not None:
+        yield "FfiConverterSequenceUInt16/numpy/{}".format(size), U.FfiConverterSequenceUInt16, numpy.zeros(size, dtype=numpy.uint16)
+
+
+def check(U):
+    instrumentation = U.uniffi_enable_instrumentation()
+    failures = []
+    for size in SIZES:
+        for name, converter, value in shapes(U, size):
+            instrumentation.reset()
+            if converter is None:
+                rbuf = U._uniffi_lower_CustomType(value)
+            else:
+                rbuf = converter.lower(value)
+            buffers = instrumentation.snapshot()["buffers"]
+            rbuf.free()
+            if buffers["alloc"] != 1 or buffers["reserve"] != 0:
+                failures.append("{}: {} allocs, {} reserves".format(name, buffers["alloc"], buffers["reserve"]))
+    U.uniffi_disable_instrumentation()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--standin", action="store_true", help="check against the C stand-in library")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        if args.standin:
+            os.environ["UNIFFI_CUSTOM_BUG_LIBRARY_PATH"] = suite.build_standin(build_dir)
+        sys.path.insert(0, suite.BINDINGS_DIR)
+        import UniffiCustomBug
+
+        failures = check(UniffiCustomBug)
+
+    for failure in failures:
+        print("FAIL: " + failure, file=sys.stderr)
+    if not failures:
+        print("every lowered value took one allocation and no reserve")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Check that values too large for a RustBuffer fail the same way on every lowering path.
+
+Lowers byte strings just past the 2 GiB limit of a RustBuffer with the flattened CustomType
+lowering, the converter chain and a RustBufferBuilder, and exits with status 1 unless every
+path raises the same ValueError before anything reaches Rust:
+
+    python bindings/python/benches/check_size_limit.py --standin
+
+The values are zero-filled `bytes`, which the allocator maps lazily, so this needs a few GiB
+of address space but not of memory.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import suite  # noqa: E402
+
+# Just past the limit once the length prefix is added, past it on its own, and a size that
+# an i32 would silently truncate to a small one.
+SIZES = [2**31 - 4, 2**31, 2**32 + 8]
+
+
+def paths(U):
+    def builder_write(value):
+        builder = U.RustBufferBuilder()
+        try:
+            U.FfiConverterBytes.write(value, builder)
+        finally:
+            builder.discard()
+
+    yield "CustomType/flattened", U._uniffi_lower_CustomType
+    yield "FfiConverterTypeCustomType.lower", U.FfiConverterTypeCustomType.lower
+    yield "FfiConverterBytes.lower", U.FfiConverterBytes.lower
+    yield "RustBufferBuilder", builder_write
+
+
+def check(U):
+    failures = []
+    for size in SIZES:
+        value = bytes(size)
+        errors = {}
+        for name, lower in paths(U):
+            try:
+                lower(value).free()
+            except Exception as e:
+                errors[name] = "{}: {}".format(type(e).__name__, e)
+            else:
+                errors[name] = "no error"
+        expected = "ValueError: value too large for a RustBuffer ({} bytes)".format(size + 4)
+        for name, error in errors.items():
+            if error != expected:
+                failures.append("{}/{}: {}".format(name, size, error))
+        del value
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--standin", action="store_true", help="check against the C stand-in library")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        if args.standin:
+            os.environ["UNIFFI_CUSTOM_BUG_LIBRARY_PATH"] = suite.build_standin(build_dir)
+        sys.path.insert(0, suite.BINDINGS_DIR)
+        import UniffiCustomBug
+
+        failures = check(UniffiCustomBug)
+
+    for failure in failures:
+        print("FAIL: " + failure, file=sys.stderr)
+    if not failures:
+        print("every lowering path rejected oversized values with the same ValueError")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
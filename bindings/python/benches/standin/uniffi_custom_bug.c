@@ -0,0 +1,351 @@
+/*
+ * Stand-in for libuniffi_custom_bug.so, for benchmarking the Python bindings without a Rust
+ * toolchain.
+ *
+ * It exports the same symbols with the same ABI as the uniffi scaffolding and src/ffi.rs, and
+ * mimics their allocation behaviour (zeroed allocations, amortized growth in reserve, consuming
+ * the RustBuffer arguments).  The functions themselves don't do any work, so the benchmarks
+ * measure the bindings' overhead.
+ */
+
+#include <pthread.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+typedef struct {
+    int32_t capacity;
+    int32_t len;
+    uint8_t *data;
+} RustBuffer;
+
+typedef struct {
+    int32_t len;
+    const uint8_t *data;
+} ForeignBytes;
+
+typedef struct {
+    int8_t code;
+    RustBuffer error_buf;
+} RustCallStatus;
+
+#define CALL_PANIC 2
+
+static RustBuffer buffer_with_capacity(int32_t capacity, RustCallStatus *status) {
+    RustBuffer buf = {0, 0, NULL};
+    if (capacity < 0) {
+        status->code = CALL_PANIC;
+        return buf;
+    }
+    buf.data = calloc(capacity ? capacity : 1, 1);
+    if (buf.data == NULL) {
+        status->code = CALL_PANIC;
+        return buf;
+    }
+    buf.capacity = capacity;
+    return buf;
+}
+
+RustBuffer ffi_UniffiCustomBug_rustbuffer_alloc(int32_t size, RustCallStatus *status) {
+    RustBuffer buf = buffer_with_capacity(size, status);
+    buf.len = buf.capacity;
+    return buf;
+}
+
+RustBuffer ffi_UniffiCustomBug_rustbuffer_from_bytes(ForeignBytes bytes, RustCallStatus *status) {
+    RustBuffer buf = buffer_with_capacity(bytes.len, status);
+    if (buf.data != NULL) {
+        memcpy(buf.data, bytes.data, bytes.len);
+        buf.len = bytes.len;
+    }
+    return buf;
+}
+
+void ffi_UniffiCustomBug_rustbuffer_free(RustBuffer buf, RustCallStatus *status) {
+    free(buf.data);
+}
+
+RustBuffer ffi_UniffiCustomBug_rustbuffer_reserve(RustBuffer buf, int32_t additional, RustCallStatus *status) {
+    int64_t required = (int64_t)buf.len + additional;
+    if (additional < 0 || required > INT32_MAX) {
+        status->code = CALL_PANIC;
+        return buf;
+    }
+    if (required > buf.capacity) {
+        /* Like Vec::reserve: at least double the capacity */
+        int64_t capacity = (int64_t)buf.capacity * 2;
+        if (capacity < required) {
+            capacity = required;
+        }
+        if (capacity > INT32_MAX) {
+            capacity = INT32_MAX;
+        }
+        uint8_t *data = realloc(buf.data, capacity);
+        if (data == NULL) {
+            status->code = CALL_PANIC;
+            return buf;
+        }
+        buf.data = data;
+        buf.capacity = (int32_t)capacity;
+    }
+    return buf;
+}
+
+void ffi_UniffiCustomBug_rustbuffer_alloc_many(int32_t size, int32_t count, RustBuffer *out, RustCallStatus *status) {
+    for (int32_t i = 0; i < count; i++) {
+        out[i] = ffi_UniffiCustomBug_rustbuffer_alloc(size, status);
+    }
+}
+
+void ffi_UniffiCustomBug_rustbuffer_free_many(RustBuffer *bufs, int32_t count, RustCallStatus *status) {
+    for (int32_t i = 0; i < count; i++) {
+        free(bufs[i].data);
+    }
+}
+
+/*
+ * Test helpers, not part of the library: make `test_fn` panic for values of a given length
+ * (-1 for none), and count the values it was called with.
+ */
+
+static volatile int32_t standin_failing_length = -1;
+static volatile int64_t standin_test_fn_count;
+
+void standin_fail_on_length(int32_t len) {
+    standin_failing_length = len;
+}
+
+int64_t standin_test_fn_calls(void) {
+    return __atomic_load_n(&standin_test_fn_count, __ATOMIC_RELAXED);
+}
+
+static void test_fn(int32_t len, RustCallStatus *status) {
+    __atomic_add_fetch(&standin_test_fn_count, 1, __ATOMIC_RELAXED);
+    if (len == standin_failing_length) {
+        status->code = CALL_PANIC;
+    }
+}
+
+void uniffi_uniffi_custom_bug_fn_func_test_fn(RustBuffer type_param, RustCallStatus *status) {
+    test_fn(type_param.len - 4, status);
+    free(type_param.data);
+}
+
+void uniffi_uniffi_custom_bug_fn_func_test_fn_borrowed(ForeignBytes type_param, RustCallStatus *status) {
+    test_fn(type_param.len, status);
+}
+
+typedef struct {
+    uint64_t len;
+} StreamSession;
+
+uint64_t uniffi_uniffi_custom_bug_fn_func_test_fn_stream_open(RustCallStatus *status) {
+    StreamSession *session = calloc(1, sizeof(StreamSession));
+    if (session == NULL) {
+        status->code = CALL_PANIC;
+    }
+    return (uint64_t)(uintptr_t)session;
+}
+
+void uniffi_uniffi_custom_bug_fn_func_test_fn_stream_push(uint64_t session, ForeignBytes chunk, RustCallStatus *status) {
+    ((StreamSession *)(uintptr_t)session)->len += chunk.len;
+}
+
+void uniffi_uniffi_custom_bug_fn_func_test_fn_stream_finish(uint64_t session, RustCallStatus *status) {
+    free((StreamSession *)(uintptr_t)session);
+}
+
+void uniffi_uniffi_custom_bug_fn_func_test_fn_stream_abort(uint64_t session, RustCallStatus *status) {
+    free((StreamSession *)(uintptr_t)session);
+}
+
+/* Foreign executor callback, like uniffi_core's */
+
+typedef void (*ForeignExecutorCallback)(size_t executor, uint32_t delay, const void *task, const void *task_data);
+
+static ForeignExecutorCallback foreign_executor_callback;
+
+void uniffi_foreign_executor_callback_set(ForeignExecutorCallback callback) {
+    foreign_executor_callback = callback;
+}
+
+/* Callback queue (src/ffi.rs) */
+
+typedef struct {
+    size_t executor;
+    uint32_t delay;
+    const void *task;
+    const void *task_data;
+} QueuedCallback;
+
+static pthread_mutex_t queue_lock = PTHREAD_MUTEX_INITIALIZER;
+static pthread_cond_t queue_ready = PTHREAD_COND_INITIALIZER;
+static QueuedCallback *queue_items;
+static size_t queue_head, queue_len, queue_capacity;
+static int queue_closed;
+static ForeignExecutorCallback queue_forward;
+
+void ffi_UniffiCustomBug_callback_queue_push(size_t executor, uint32_t delay, const void *task, const void *task_data) {
+    pthread_mutex_lock(&queue_lock);
+    if (queue_closed && queue_forward) {
+        ForeignExecutorCallback forward = queue_forward;
+        pthread_mutex_unlock(&queue_lock);
+        forward(executor, delay, task, task_data);
+        return;
+    }
+    if (queue_len == queue_capacity) {
+        size_t capacity = queue_capacity ? queue_capacity * 2 : 64;
+        QueuedCallback *items = malloc(capacity * sizeof(QueuedCallback));
+        for (size_t i = 0; i < queue_len; i++) {
+            items[i] = queue_items[(queue_head + i) % queue_capacity];
+        }
+        free(queue_items);
+        queue_items = items;
+        queue_head = 0;
+        queue_capacity = capacity;
+    }
+    QueuedCallback callback = {executor, delay, task, task_data};
+    queue_items[(queue_head + queue_len++) % queue_capacity] = callback;
+    pthread_cond_signal(&queue_ready);
+    pthread_mutex_unlock(&queue_lock);
+}
+
+static struct timespec deadline_after(long ns) {
+    struct timespec deadline;
+    clock_gettime(CLOCK_REALTIME, &deadline);
+    deadline.tv_sec += ns / 1000000000L;
+    deadline.tv_nsec += ns % 1000000000L;
+    if (deadline.tv_nsec >= 1000000000L) {
+        deadline.tv_sec++;
+        deadline.tv_nsec -= 1000000000L;
+    }
+    return deadline;
+}
+
+int32_t ffi_UniffiCustomBug_callback_queue_drain(QueuedCallback *out, int32_t max, uint32_t wait_ms, uint32_t linger_us, RustCallStatus *status) {
+    pthread_mutex_lock(&queue_lock);
+    struct timespec deadline = deadline_after((long)wait_ms * 1000000L);
+    while (queue_len == 0 && !queue_closed) {
+        if (pthread_cond_timedwait(&queue_ready, &queue_lock, &deadline) != 0) {
+            break;
+        }
+    }
+    deadline = deadline_after((long)linger_us * 1000L);
+    while (queue_len < (size_t)max && !queue_closed) {
+        if (pthread_cond_timedwait(&queue_ready, &queue_lock, &deadline) != 0) {
+            break;
+        }
+    }
+    int32_t count = queue_len < (size_t)max ? (int32_t)queue_len : max;
+    for (int32_t i = 0; i < count; i++) {
+        out[i] = queue_items[queue_head];
+        queue_head = (queue_head + 1) % queue_capacity;
+        queue_len--;
+    }
+    pthread_mutex_unlock(&queue_lock);
+    return count;
+}
+
+void ffi_UniffiCustomBug_callback_queue_set_closed(int8_t closed, ForeignExecutorCallback forward, RustCallStatus *status) {
+    pthread_mutex_lock(&queue_lock);
+    queue_closed = closed;
+    queue_forward = closed ? forward : NULL;
+    pthread_cond_broadcast(&queue_ready);
+    pthread_mutex_unlock(&queue_lock);
+}
+
+void ffi_UniffiCustomBug_callback_queue_reset(RustCallStatus *status) {
+    /* The old lock may be held by a thread that didn't survive the fork: leak it and the items */
+    pthread_mutex_init(&queue_lock, NULL);
+    pthread_cond_init(&queue_ready, NULL);
+    queue_items = NULL;
+    queue_head = queue_len = queue_capacity = 0;
+    queue_closed = 0;
+    queue_forward = NULL;
+}
+
+/*
+ * Benchmark helpers, not part of the library: call the foreign executor callback `count` times
+ * from each of `threads` native threads, with a task that counts how often it ran.
+ */
+
+static volatile int64_t standin_tasks_run_count;
+
+static void standin_task(const void *task_data) {
+    __atomic_add_fetch(&standin_tasks_run_count, 1, __ATOMIC_RELAXED);
+}
+
+typedef struct {
+    size_t executor;
+    int32_t count;
+} FireArgs;
+
+static void *fire_callbacks(void *arg) {
+    FireArgs *args = arg;
+    for (int32_t i = 0; i < args->count; i++) {
+        foreign_executor_callback(args->executor, 0, (const void *)standin_task, NULL);
+    }
+    return NULL;
+}
+
+void standin_fire_callbacks(size_t executor, int32_t threads, int32_t count) {
+    pthread_t workers[64];
+    FireArgs args = {executor, count};
+    if (threads > 64) {
+        threads = 64;
+    }
+    for (int32_t i = 0; i < threads; i++) {
+        pthread_create(&workers[i], NULL, fire_callbacks, &args);
+    }
+    for (int32_t i = 0; i < threads; i++) {
+        pthread_join(workers[i], NULL);
+    }
+}
+
+int64_t standin_tasks_run(void) {
+    return __atomic_load_n(&standin_tasks_run_count, __ATOMIC_RELAXED);
+}
+
+static int read_len(const RustBuffer *buf, int32_t *offset, int32_t *len) {
+    if (*offset + 4 > buf->len) {
+        return 0;
+    }
+    const uint8_t *p = buf->data + *offset;
+    *len = (int32_t)(((uint32_t)p[0] << 24) | ((uint32_t)p[1] << 16) | ((uint32_t)p[2] << 8) | p[3]);
+    *offset += 4;
+    return *len >= 0;
+}
+
+void uniffi_uniffi_custom_bug_fn_func_test_fn_many(RustBuffer type_params, int32_t *processed, RustCallStatus *status) {
+    int32_t offset = 0;
+    int32_t count;
+    *processed = 0;
+    if (!read_len(&type_params, &offset, &count)) {
+        status->code = CALL_PANIC;
+    }
+    for (int32_t i = 0; status->code == 0 && i < count; i++) {
+        int32_t len;
+        if (!read_len(&type_params, &offset, &len) || offset + len > type_params.len) {
+            status->code = CALL_PANIC;
+            break;
+        }
+        offset += len;
+        test_fn(len, status);
+        if (status->code == 0) {
+            (*processed)++;
+        }
+    }
+    if (status->code == 0 && offset != type_params.len) {
+        status->code = CALL_PANIC;
+    }
+    free(type_params.data);
+}
+
+uint16_t uniffi_uniffi_custom_bug_checksum_func_test_fn(void) {
+    return 13503;
+}
+
+uint32_t ffi_UniffiCustomBug_uniffi_contract_version(void) {
+    return 22;
+}
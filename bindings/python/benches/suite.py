@@ -0,0 +1,213 @@
+"""
+Benchmark suite for the hot paths of the Python bindings.
+
+Covers RustBufferBuilder, RustBufferStream, the Bytes, String and CustomType converters and
+`test_fn` across payload sizes and thread counts, and emits the results as JSON.
+
+    # Against the real library (next to UniffiCustomBug.py or in UNIFFI_CUSTOM_BUG_LIBRARY_PATH)
+    python bindings/python/benches/suite.py --output results.json
+
+    # Against the C stand-in in benches/standin, built on the fly with $CC (default: cc)
+    python bindings/python/benches/suite.py --standin --output results.json
+
+    # Fail if anything got more than 10% slower than a stored run
+    python bindings/python/benches/suite.py --standin --baseline baseline.json --max-regression 0.1
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHES_DIR = os.path.dirname(os.path.abspath(__file__))
+BINDINGS_DIR = os.path.dirname(BENCHES_DIR)
+STANDIN_SOURCE = os.path.join(BENCHES_DIR, "standin", "uniffi_custom_bug.c")
+
+SIZES = [16, 1024, 64 * 1024, 1024 * 1024]
+THREADS = [1, 2, 4, 8]
+PRIMITIVES_PER_OP = 1000
+
+UniffiCustomBug = None
+
+
+def build_standin(build_dir):
+    path = os.path.join(build_dir, "libuniffi_custom_bug.so")
+    compiler = os.environ.get("CC", "cc")
+    subprocess.run([compiler, "-O2", "-shared", "-fPIC", "-pthread", "-o", path, STANDIN_SOURCE], check=True)
+    return path
+
+
+def measure(op, min_time, repeats, threads=1):
+    """
+    Run `op` in `threads` threads for `min_time` seconds, `repeats` times, and return the best
+    rate in operations per second.
+    """
+    best = 0.0
+    for _ in range(repeats):
+        counts = [0] * threads
+        barrier = threading.Barrier(threads + 1)
+        stop = threading.Event()
+
+        def worker(index):
+            barrier.wait()
+            count = 0
+            while not stop.is_set():
+                op()
+                count += 1
+            counts[index] = count
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        time.sleep(min_time)
+        stop.set()
+        for thread in workers:
+            thread.join()
+        best = max(best, sum(counts) / (time.perf_counter() - start))
+    return best
+
+
+def lowered(converter, value):
+    # A fresh buffer for each lift, since lifting consumes it
+    return lambda: converter.lift(converter.lower(value))
+
+
+def cases(sizes, threads):
+    U = UniffiCustomBug
+
+    def builder_write(payload):
+        builder = U.RustBufferBuilder()
+        builder.write(payload)
+        builder.discard()
+
+    def builder_primitives():
+        builder = U.RustBufferBuilder()
+        for i in range(PRIMITIVES_PER_OP):
+            builder.writeI32(i)
+        builder.discard()
+
+    def stream_read(rbuf):
+        with rbuf.readWithStream() as stream:
+            stream.read(stream.remaining())
+
+    def stream_primitives(rbuf):
+        with rbuf.readWithStream() as stream:
+            for _ in range(PRIMITIVES_PER_OP):
+                stream.readI32()
+
+    builder = U.RustBufferBuilder()
+    for i in range(PRIMITIVES_PER_OP):
+        builder.writeI32(i)
+    primitives_rbuf = builder.finalize()
+    try:
+        yield "RustBufferBuilder.writeI32", PRIMITIVES_PER_OP * 4, 1, builder_primitives
+        yield "RustBufferStream.readI32", PRIMITIVES_PER_OP * 4, 1, lambda: stream_primitives(primitives_rbuf)
+    finally:
+        primitives_rbuf.free()
+
+    for size in sizes:
+        payload = os.urandom(size)
+        text = "x" * size
+        yield "RustBufferBuilder.write/{}".format(size), size, 1, lambda payload=payload: builder_write(payload)
+        rbuf = U.FfiConverterBytes.lower(payload)
+        try:
+            yield "RustBufferStream.read/{}".format(size), size, 1, lambda rbuf=rbuf: stream_read(rbuf)
+        finally:
+            rbuf.free()
+        yield "FfiConverterBytes.lower/{}".format(size), size, 1, lambda payload=payload: U.FfiConverterBytes.lower(payload).free()
+        yield "FfiConverterBytes.roundtrip/{}".format(size), size, 1, lowered(U.FfiConverterBytes, payload)
+        yield "FfiConverterString.lower/{}".format(size), size, 1, lambda text=text: U.FfiConverterString.lower(text).free()
+        yield "FfiConverterString.roundtrip/{}".format(size), size, 1, lowered(U.FfiConverterString, text)
+        yield "FfiConverterTypeCustomType.lower/{}".format(size), size, 1, lambda payload=payload: U.FfiConverterTypeCustomType.lower(payload).free()
+        for count in threads:
+            yield "test_fn/{}/threads={}".format(size, count), size, count, lambda payload=payload: U.test_fn(payload)
+
+
+def run(args):
+    results = {}
+    for name, size, threads, op in cases(args.sizes, args.threads):
+        if args.filter and args.filter not in name:
+            continue
+        ops = measure(op, args.min_time, args.repeats, threads)
+        results[name] = {"ops_per_s": ops, "mb_per_s": ops * size / 1e6}
+        print("{:<48} {:>14.0f} ops/s {:>12.1f} MB/s".format(name, ops, ops * size / 1e6), file=sys.stderr)
+    return {
+        "meta": {
+            "python": sys.version,
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "library": UniffiCustomBug._UniFFILib._name,
+            "standin": args.standin,
+            "min_time": args.min_time,
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, max_regression):
+    """
+    Print the change of each benchmark against `baseline` and return the names of the ones
+    that got slower by more than `max_regression`.
+    """
+    regressions = []
+    for name, result in sorted(report["results"].items()):
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        ratio = result["ops_per_s"] / previous["ops_per_s"]
+        flag = ""
+        if ratio < 1 - max_regression:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("{:<48} {:>+8.1%}{}".format(name, ratio - 1, flag), file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--standin", action="store_true", help="benchmark against the C stand-in library")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.1, help="allowed slowdown against the baseline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--threads", type=int, nargs="+", default=THREADS)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per measurement")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    args = parser.parse_args()
+
+    global UniffiCustomBug
+    with tempfile.TemporaryDirectory() as build_dir:
+        if args.standin:
+            os.environ["UNIFFI_CUSTOM_BUG_LIBRARY_PATH"] = build_standin(build_dir)
+        sys.path.insert(0, BINDINGS_DIR)
+        import UniffiCustomBug
+
+        report = run(args)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print("{} benchmark(s) regressed by more than {:.0%}".format(len(regressions), args.max_regression), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -371,29 +371,6 @@ public struct FfiConverterTypeCustomType: FfiConverter {
 }
 
 
-/**
- * Typealias from the type name used in the UDL file to the builtin type.  This
- * is needed because the UDL type name is used in function/method signatures.
- */
-public typealias CustomType = [UInt8]
-public struct FfiConverterTypeCustomType: FfiConverter {
-    public static func read(from buf: inout (data: Data, offset: Data.Index)) throws -> CustomType {
-        return try FfiConverterSequenceUInt8.read(from: &buf)
-    }
-
-    public static func write(_ value: CustomType, into buf: inout [UInt8]) {
-        return FfiConverterSequenceUInt8.write(value, into: &buf)
-    }
-
-    public static func lift(_ value: RustBuffer) throws -> CustomType {
-        return try FfiConverterSequenceUInt8.lift(value)
-    }
-
-    public static func lower(_ value: CustomType) -> RustBuffer {
-        return FfiConverterSequenceUInt8.lower(value)
-    }
-}
-
 public func `testFn`(`typeParam`: CustomType)  {
     try! rustCall() {
     uniffi_uniffi_custom_bug_fn_func_test_fn(
@@ -0,0 +1,336 @@
+//! Hand-written FFI entry points that complement the scaffolding generated from the UDL.
+//!
+//! These use the same `RustBuffer`/`RustCallStatus` ABI as the generated functions, but they
+//! are not part of the component interface, so the bindings don't verify checksums for them.
+#![allow(non_snake_case)]
+
+use crate::{CustomType, CustomTypeRef, UniffiCustomTypeConverter};
+use std::collections::VecDeque;
+use std::ffi::c_void;
+use std::panic::AssertUnwindSafe;
+use std::sync::atomic::{AtomicPtr, Ordering};
+use std::sync::{Condvar, Mutex, MutexGuard};
+use std::time::{Duration, Instant};
+use uniffi::{ForeignBytes, RustBuffer, RustCallStatus};
+
+/// Allocate `count` buffers with a capacity of `size` bytes each and write them to `out`.
+///
+/// This lets the foreign buffer pool refill a size class with a single FFI call.
+#[no_mangle]
+pub extern "C" fn ffi_UniffiCustomBug_rustbuffer_alloc_many(
+    size: i32,
+    count: i32,
+    out: *mut RustBuffer,
+    call_status: &mut RustCallStatus,
+) {
+    uniffi::rust_call(call_status, || {
+        let size = usize::try_from(size).expect("buffer size negative or overflowed");
+        let count = usize::try_from(count).expect("buffer count negative or overflowed");
+        for i in 0..count {
+            // Safety: the caller passes an array of at least `count` buffers
+            unsafe { out.add(i).write(RustBuffer::new_with_size(size)) };
+        }
+        Ok(())
+    })
+}
+
+/// Free the `count` buffers in `bufs`, which the foreign side evicted from its buffer pool.
+#[no_mangle]
+pub extern "C" fn ffi_UniffiCustomBug_rustbuffer_free_many(
+    bufs: *const RustBuffer,
+    count: i32,
+    call_status: &mut RustCallStatus,
+) {
+    uniffi::rust_call(call_status, || {
+        let count = usize::try_from(count).expect("buffer count negative or overflowed");
+        for i in 0..count {
+            // Safety: the caller passes an array of at least `count` buffers and gives up
+            // ownership of all of them
+            unsafe { bufs.add(i).read() }.destroy();
+        }
+        Ok(())
+    })
+}
+
+/// Call `test_fn` for each value in `values`, which is serialized like a `Vec<CustomType>`:
+/// an i32 count followed by that many i32-length-prefixed byte strings.
+///
+/// Values that fail to lift panic, like they do for the generated scalar function, and every
+/// value before the failing one has already been processed.  `processed` is set to the number
+/// of values `test_fn` returned for, so on failure it is the index of the failing value.
+#[no_mangle]
+pub extern "C" fn uniffi_uniffi_custom_bug_fn_func_test_fn_many(
+    values: RustBuffer,
+    processed: &mut i32,
+    call_status: &mut RustCallStatus,
+) {
+    *processed = 0;
+    // Only written between values, so it's consistent after a panic
+    let mut processed = AssertUnwindSafe(processed);
+    uniffi::rust_call(call_status, move || {
+        let data = values.destroy_into_vec();
+        let mut reader = data.as_slice();
+        let count = read_len(&mut reader);
+        for _ in 0..count {
+            let len = read_len(&mut reader);
+            let value = read_bytes(&mut reader, len);
+            let value = CustomType::into_custom(value.to_vec())
+                .expect("Failed to convert arg 'type_param': CustomType");
+            crate::test_fn(value);
+            **processed += 1;
+        }
+        assert!(reader.is_empty(), "junk data left in buffer after test_fn_many");
+        Ok(())
+    })
+}
+
+/// Borrowing variant of `test_fn`: the bytes are read straight out of the foreign memory for
+/// the duration of the call, instead of being copied into a `RustBuffer` first.
+#[no_mangle]
+pub extern "C" fn uniffi_uniffi_custom_bug_fn_func_test_fn_borrowed(
+    type_param: ForeignBytes,
+    call_status: &mut RustCallStatus,
+) {
+    uniffi::rust_call(call_status, || {
+        let value = CustomTypeRef::from_builtin(type_param.as_slice())
+            .expect("Failed to convert arg 'type_param': CustomType");
+        crate::test_fn_ref(value);
+        Ok(())
+    })
+}
+
+/// Start a streaming `test_fn` call, for values too large to pass in one buffer.
+///
+/// Returns a session handle for `test_fn_stream_push`, which appends a chunk of the value,
+/// and `test_fn_stream_finish`, which calls `test_fn` with everything pushed so far.  A session
+/// that won't be finished must be released with `test_fn_stream_abort`.
+#[no_mangle]
+pub extern "C" fn uniffi_uniffi_custom_bug_fn_func_test_fn_stream_open(
+    call_status: &mut RustCallStatus,
+) -> u64 {
+    uniffi::rust_call(call_status, || {
+        Ok(Box::into_raw(Box::new(Vec::<u8>::new())) as usize as u64)
+    })
+}
+
+#[no_mangle]
+pub extern "C" fn uniffi_uniffi_custom_bug_fn_func_test_fn_stream_push(
+    session: u64,
+    chunk: ForeignBytes,
+    call_status: &mut RustCallStatus,
+) {
+    uniffi::rust_call(call_status, || {
+        // Safety: the handle comes from `test_fn_stream_open` and hasn't been finished or
+        // aborted, and the caller doesn't use it from several threads at once
+        let value = unsafe { &mut *(session as usize as *mut Vec<u8>) };
+        value.extend_from_slice(chunk.as_slice());
+        Ok(())
+    })
+}
+
+#[no_mangle]
+pub extern "C" fn uniffi_uniffi_custom_bug_fn_func_test_fn_stream_finish(
+    session: u64,
+    call_status: &mut RustCallStatus,
+) {
+    uniffi::rust_call(call_status, || {
+        // Safety: as for `test_fn_stream_push`, and the handle isn't used after this
+        let value = *unsafe { Box::from_raw(session as usize as *mut Vec<u8>) };
+        let value = CustomType::into_custom(value)
+            .expect("Failed to convert arg 'type_param': CustomType");
+        crate::test_fn(value);
+        Ok(())
+    })
+}
+
+#[no_mangle]
+pub extern "C" fn uniffi_uniffi_custom_bug_fn_func_test_fn_stream_abort(
+    session: u64,
+    call_status: &mut RustCallStatus,
+) {
+    uniffi::rust_call(call_status, || {
+        // Safety: as for `test_fn_stream_finish`
+        drop(unsafe { Box::from_raw(session as usize as *mut Vec<u8>) });
+        Ok(())
+    })
+}
+
+/// A foreign-executor callback waiting in the callback queue, with the arguments of
+/// `ForeignExecutorCallback`.
+#[repr(C)]
+pub struct QueuedCallback {
+    executor: usize,
+    delay: u32,
+    task: *const c_void,
+    task_data: *const c_void,
+}
+
+// Safety: the task pointers are only called by the foreign side, which may do so from any
+// thread, like with the direct callback
+unsafe impl Send for QueuedCallback {}
+
+/// The foreign executor callback, which `callback_queue_push` forwards to once the queue is
+/// closed.
+pub type ForeignExecutorCallback =
+    extern "C" fn(executor: usize, delay: u32, task: *const c_void, task_data: *const c_void);
+
+struct CallbackQueueState {
+    callbacks: VecDeque<QueuedCallback>,
+    closed: bool,
+    forward: Option<ForeignExecutorCallback>,
+}
+
+struct CallbackQueue {
+    state: Mutex<CallbackQueueState>,
+    ready: Condvar,
+}
+
+impl CallbackQueue {
+    const fn new() -> Self {
+        Self {
+            state: Mutex::new(CallbackQueueState {
+                callbacks: VecDeque::new(),
+                closed: false,
+                forward: None,
+            }),
+            ready: Condvar::new(),
+        }
+    }
+
+    fn lock(&self) -> MutexGuard<'_, CallbackQueueState> {
+        self.state.lock().unwrap_or_else(|err| err.into_inner())
+    }
+}
+
+static INITIAL_CALLBACK_QUEUE: CallbackQueue = CallbackQueue::new();
+// Only ever replaced by `callback_queue_reset`, which leaks the previous queue
+static CALLBACK_QUEUE: AtomicPtr<CallbackQueue> =
+    AtomicPtr::new(&INITIAL_CALLBACK_QUEUE as *const CallbackQueue as *mut CallbackQueue);
+
+fn callback_queue() -> &'static CallbackQueue {
+    // Safety: the pointer is either to the static or to a leaked Box
+    unsafe { &*CALLBACK_QUEUE.load(Ordering::Acquire) }
+}
+
+/// Foreign-executor callback that queues the call instead of calling into the foreign side.
+///
+/// Register this with `uniffi_foreign_executor_callback_set` and have a foreign thread take the
+/// queued calls in batches with `callback_queue_drain`.  Rust threads then never wait for the
+/// foreign runtime (e.g. for Python's GIL) to schedule a task.  Once the queue has been closed
+/// with a forward callback, calls go to that callback instead, so none are left in a queue
+/// that nobody drains anymore.
+#[no_mangle]
+pub extern "C" fn ffi_UniffiCustomBug_callback_queue_push(
+    executor: usize,
+    delay: u32,
+    task: *const c_void,
+    task_data: *const c_void,
+) {
+    let queue = callback_queue();
+    let mut state = queue.lock();
+    if state.closed {
+        if let Some(forward) = state.forward {
+            // Outside of the lock: the callback may block, e.g. on Python's GIL
+            drop(state);
+            forward(executor, delay, task, task_data);
+            return;
+        }
+    }
+    state.callbacks.push_back(QueuedCallback {
+        executor,
+        delay,
+        task,
+        task_data,
+    });
+    queue.ready.notify_one();
+}
+
+/// Move up to `max` queued callbacks to `out` and return how many.
+///
+/// Waits up to `wait_ms` milliseconds for the first one, then up to `linger_us` microseconds
+/// for the batch to fill up.  Once the queue is closed, this doesn't wait and returns 0 when
+/// the remaining callbacks have been taken.
+#[no_mangle]
+pub extern "C" fn ffi_UniffiCustomBug_callback_queue_drain(
+    out: *mut QueuedCallback,
+    max: i32,
+    wait_ms: u32,
+    linger_us: u32,
+    call_status: &mut RustCallStatus,
+) -> i32 {
+    uniffi::rust_call(call_status, || {
+        let max = usize::try_from(max).expect("batch size negative or overflowed");
+        let queue = callback_queue();
+        let (mut state, _) = queue
+            .ready
+            .wait_timeout_while(queue.lock(), Duration::from_millis(wait_ms.into()), |state| {
+                state.callbacks.is_empty() && !state.closed
+            })
+            .unwrap_or_else(|err| err.into_inner());
+        let deadline = Instant::now() + Duration::from_micros(linger_us.into());
+        while state.callbacks.len() < max && !state.closed {
+            let now = Instant::now();
+            if now >= deadline {
+                break;
+            }
+            state = queue
+                .ready
+                .wait_timeout(state, deadline - now)
+                .unwrap_or_else(|err| err.into_inner())
+                .0;
+        }
+        let count = state.callbacks.len().min(max);
+        for (i, callback) in state.callbacks.drain(..count).enumerate() {
+            // Safety: the caller passes an array of at least `max` entries
+            unsafe { out.add(i).write(callback) };
+        }
+        Ok(count as i32)
+    })
+}
+
+/// Open (`closed == 0`) or close the callback queue.  Closing wakes up `callback_queue_drain`,
+/// which still returns the callbacks queued so far, and makes `callback_queue_push` call
+/// `forward` from then on, if it isn't null.
+#[no_mangle]
+pub extern "C" fn ffi_UniffiCustomBug_callback_queue_set_closed(
+    closed: i8,
+    forward: Option<ForeignExecutorCallback>,
+    call_status: &mut RustCallStatus,
+) {
+    uniffi::rust_call(call_status, || {
+        let queue = callback_queue();
+        let mut state = queue.lock();
+        state.closed = closed != 0;
+        state.forward = if state.closed { forward } else { None };
+        queue.ready.notify_all();
+        Ok(())
+    })
+}
+
+/// Replace the callback queue with a new, open and empty one.
+///
+/// For the child of a `fork()`: a thread of the parent that no longer exists in the child may
+/// have held the lock of the old queue, so it can't be used or even freed anymore, and is
+/// leaked along with the callbacks of the parent's futures that it held.  Must not be called
+/// while other threads use the queue.
+#[no_mangle]
+pub extern "C" fn ffi_UniffiCustomBug_callback_queue_reset(call_status: &mut RustCallStatus) {
+    uniffi::rust_call(call_status, || {
+        let queue = Box::into_raw(Box::new(CallbackQueue::new()));
+        CALLBACK_QUEUE.store(queue, Ordering::Release);
+        Ok(())
+    })
+}
+
+fn read_bytes<'a>(reader: &mut &'a [u8], len: usize) -> &'a [u8] {
+    assert!(reader.len() >= len, "read past end of buffer");
+    let (head, rest) = reader.split_at(len);
+    *reader = rest;
+    head
+}
+
+fn read_len(reader: &mut &[u8]) -> usize {
+    let bytes = read_bytes(reader, 4);
+    let len = i32::from_be_bytes([bytes[0], bytes[1], bytes[2], bytes[3]]);
+    usize::try_from(len).expect("negative length")
+}
@@ -1,10 +1,35 @@
 uniffi::include_scaffolding!("UniffiCustomBug");
 
+mod ffi;
+
 pub struct CustomType(Vec<u8>);
+
+impl CustomType {
+    pub fn view(&self) -> CustomTypeRef<'_> {
+        CustomTypeRef(&self.0)
+    }
+}
+
+/// A `CustomType` that borrows its bytes, for entry points that read them straight out of
+/// foreign memory.
+pub struct CustomTypeRef<'a>(&'a [u8]);
+
+impl<'a> CustomTypeRef<'a> {
+    /// The checks `into_custom` makes, without taking ownership of the bytes.
+    pub(crate) fn from_builtin(val: &'a [u8]) -> uniffi::Result<Self> {
+        Ok(Self(val))
+    }
+
+    pub fn as_bytes(&self) -> &'a [u8] {
+        self.0
+    }
+}
+
 impl crate::UniffiCustomTypeConverter for CustomType {
     type Builtin = Vec<u8>;
 
     fn into_custom(val: Self::Builtin) -> uniffi::Result<Self> {
+        CustomTypeRef::from_builtin(&val)?;
         Ok(Self(val))
     }
 
@@ -14,4 +39,9 @@ impl crate::UniffiCustomTypeConverter for CustomType {
 }
 
 #[uniffi::export]
-pub fn test_fn(type_param: CustomType) {}
+pub fn test_fn(type_param: CustomType) {
+    test_fn_ref(type_param.view())
+}
+
+/// The body of `test_fn`, which only needs to borrow the bytes.
+pub(crate) fn test_fn_ref(_type_param: CustomTypeRef<'_>) {}
@@ -1,3 +1,266 @@
+//! `uniffi-bindgen`, followed by a check of the bindings it generated.
+//!
+//! uniffi 0.24 can emit a custom type twice when its builtin is `bytes`: once with the bytes
+//! representation and once as a sequence of `u8`.  The second declaration wins in Python and
+//! is a compile error in Kotlin and Swift, and it lowers values one byte at a time.
+//!
+//! `generate` therefore writes to a staging directory first.  Every `[Custom] typedef bytes`
+//! type from the UDL must be declared exactly once there, as an alias of the language's bytes
+//! type, otherwise this exits with an error and leaves `--out-dir` alone.  Files that pass are
+//! copied to `--out-dir`, except over existing files with different contents: the bindings
+//! checked in there are maintained by hand, so the new version is written next to them as
+//! `<file>.generated`, to be merged.
+
+use std::collections::HashMap;
+use std::ffi::OsString;
+use std::path::{Path, PathBuf};
+use std::process::{self, Command};
+use std::time::{SystemTime, UNIX_EPOCH};
+use std::{env, fs};
+
+const UDL: &str = concat!(env!("CARGO_MANIFEST_DIR"), "/src/UniffiCustomBug.udl");
+
+/// Set for the child process that runs the actual `uniffi-bindgen` into the staging directory.
+const STAGING_ENV: &str = "UNIFFI_CUSTOM_BUG_BINDGEN_STAGING";
+
 fn main() {
-    uniffi::uniffi_bindgen_main()
+    if env::var_os(STAGING_ENV).is_some() {
+        uniffi::uniffi_bindgen_main();
+        return;
+    }
+    let args: Vec<OsString> = env::args_os().collect();
+    let Some((out_dir, out_dir_arg)) = generate_out_dir(&args) else {
+        uniffi::uniffi_bindgen_main();
+        return;
+    };
+    let custom_types = match fs::read_to_string(UDL) {
+        Ok(udl) => custom_types(&udl),
+        Err(err) => fail(&format!("could not read {UDL}: {err}")),
+    };
+
+    let staging = staging_dir();
+    if let Err(err) = fs::create_dir_all(&staging) {
+        fail(&format!("could not create {}: {err}", staging.display()));
+    }
+    let mut staged_args = args[1..].to_vec();
+    match &mut staged_args[out_dir_arg - 1] {
+        arg if arg.to_str().is_some_and(|arg| arg.starts_with("--out-dir=")) => {
+            let mut value = OsString::from("--out-dir=");
+            value.push(&staging);
+            *arg = value;
+        }
+        arg => *arg = staging.clone().into_os_string(),
+    }
+    let exe = env::current_exe().unwrap_or_else(|err| fail(&format!("could not find uniffi-bindgen: {err}")));
+    let status = Command::new(exe)
+        .args(&staged_args)
+        .env(STAGING_ENV, "1")
+        .status()
+        .unwrap_or_else(|err| fail(&format!("could not run uniffi-bindgen: {err}")));
+    if !status.success() {
+        process::exit(status.code().unwrap_or(1));
+    }
+
+    let files = generated_files(&staging);
+    let mut errors = Vec::new();
+    for path in &files {
+        if let Ok(source) = fs::read_to_string(path) {
+            check_bindings(path, &source, &custom_types, &mut errors);
+        }
+    }
+    if !errors.is_empty() {
+        for error in &errors {
+            eprintln!("error: {error}");
+        }
+        fail(&format!(
+            "{} was left unchanged, the generated bindings are in {}",
+            out_dir.display(),
+            staging.display(),
+        ));
+    }
+    if let Err(err) = install(&staging, &out_dir) {
+        fail(&format!("could not copy the bindings to {}: {err}", out_dir.display()));
+    }
+    let _ = fs::remove_dir_all(&staging);
+}
+
+fn fail(message: &str) -> ! {
+    eprintln!("error: {message}");
+    process::exit(1);
+}
+
+/// The `--out-dir` of a `generate` command line, and the index of the argument holding it.
+fn generate_out_dir(args: &[OsString]) -> Option<(PathBuf, usize)> {
+    if !args.iter().skip(1).any(|arg| arg == "generate") {
+        return None;
+    }
+    for (i, arg) in args.iter().enumerate().skip(1) {
+        if arg == "--out-dir" || arg == "-o" {
+            return args.get(i + 1).map(|dir| (PathBuf::from(dir), i + 1));
+        }
+        if let Some(dir) = arg.to_str().and_then(|arg| arg.strip_prefix("--out-dir=")) {
+            return Some((PathBuf::from(dir), i));
+        }
+    }
+    None
+}
+
+fn staging_dir() -> PathBuf {
+    let nanos = SystemTime::now().duration_since(UNIX_EPOCH).map_or(0, |time| time.subsec_nanos());
+    env::temp_dir().join(format!("uniffi-custom-bug-bindings-{}-{nanos}", process::id()))
+}
+
+/// Copy the files under `staging` to the same place under `out_dir`.  An existing file with
+/// different contents is kept, and the new one written next to it as `<file>.generated`.
+fn install(staging: &Path, out_dir: &Path) -> std::io::Result<()> {
+    for source in all_files(staging) {
+        let relative = source.strip_prefix(staging).expect("staged file outside of staging");
+        let mut destination = out_dir.join(relative);
+        if let Some(parent) = destination.parent() {
+            fs::create_dir_all(parent)?;
+        }
+        let contents = fs::read(&source)?;
+        match fs::read(&destination) {
+            Ok(existing) if existing == contents => continue,
+            Ok(_) => {
+                let mut name = destination.file_name().expect("file without a name").to_os_string();
+                name.push(".generated");
+                let generated = destination.with_file_name(name);
+                eprintln!(
+                    "warning: {} differs from the generated version, which was written to {}",
+                    destination.display(),
+                    generated.display(),
+                );
+                destination = generated;
+            }
+            Err(_) => {}
+        }
+        fs::write(&destination, contents)?;
+    }
+    Ok(())
+}
+
+/// Name and builtin of each typedef with the `Custom` attribute in the UDL, e.g.
+/// `[Custom] typedef bytes CustomType;`, however it's spread over lines and commented.
+fn custom_types(udl: &str) -> HashMap<String, String> {
+    let mut types = HashMap::new();
+    for definition in strip_comments(udl).split(';') {
+        let Some((attributes, definition)) = definition.trim().strip_prefix('[').and_then(|rest| rest.split_once(']'))
+        else {
+            continue;
+        };
+        if !attributes.split(',').any(|attribute| attribute.trim() == "Custom") {
+            continue;
+        }
+        if let ["typedef", builtin, name] = definition.split_whitespace().collect::<Vec<_>>().as_slice() {
+            types.insert(name.to_string(), builtin.to_string());
+        }
+    }
+    types
+}
+
+/// `udl` with its `//` and `/* */` comments replaced by spaces.
+fn strip_comments(udl: &str) -> String {
+    let mut stripped = String::with_capacity(udl.len());
+    let mut chars = udl.chars().peekable();
+    while let Some(c) = chars.next() {
+        match (c, chars.peek()) {
+            ('"', _) => {
+                // String literals (e.g. default values) may contain comment markers
+                stripped.push(c);
+                while let Some(c) = chars.next() {
+                    stripped.push(c);
+                    match c {
+                        '\\' => stripped.extend(chars.next()),
+                        '"' => break,
+                        _ => {}
+                    }
+                }
+            }
+            ('/', Some('/')) => {
+                while chars.next_if(|&c| c != '\n').is_some() {}
+                stripped.push(' ');
+            }
+            ('/', Some('*')) => {
+                chars.next();
+                let mut previous = ' ';
+                for c in chars.by_ref() {
+                    if previous == '*' && c == '/' {
+                        break;
+                    }
+                    previous = c;
+                }
+                stripped.push(' ');
+            }
+            _ => stripped.push(c),
+        }
+    }
+    stripped
+}
+
+fn all_files(dir: &Path) -> Vec<PathBuf> {
+    let mut files = Vec::new();
+    let Ok(entries) = fs::read_dir(dir) else {
+        return files;
+    };
+    for path in entries.flatten().map(|entry| entry.path()) {
+        if path.is_dir() {
+            files.extend(all_files(&path));
+        } else {
+            files.push(path);
+        }
+    }
+    files
+}
+
+fn generated_files(dir: &Path) -> Vec<PathBuf> {
+    all_files(dir)
+        .into_iter()
+        .filter(|path| matches!(path.extension().and_then(|ext| ext.to_str()), Some("py" | "kt" | "swift")))
+        .collect()
+}
+
+/// The alias and converter declaration prefixes of a custom type, and the alias target of
+/// `bytes`, in the language of `path`.
+fn declarations(path: &Path, name: &str) -> Option<(String, String, &'static str)> {
+    match path.extension()?.to_str()? {
+        "py" => Some((format!("{name} = "), format!("class FfiConverterType{name}:"), "bytes")),
+        "kt" => Some((
+            format!("public typealias {name} = "),
+            format!("public typealias FfiConverterType{name} = "),
+            "ByteArray",
+        )),
+        "swift" => Some((
+            format!("public typealias {name} = "),
+            format!("public struct FfiConverterType{name}:"),
+            "Data",
+        )),
+        _ => None,
+    }
+}
+
+fn check_bindings(path: &Path, source: &str, custom_types: &HashMap<String, String>, errors: &mut Vec<String>) {
+    for (name, builtin) in custom_types {
+        let Some((alias, converter, bytes_type)) = declarations(path, name) else {
+            continue;
+        };
+        let aliases: Vec<&str> = source.lines().filter_map(|line| line.strip_prefix(alias.as_str())).collect();
+        let converters = source.lines().filter(|line| line.starts_with(converter.as_str())).count();
+        if aliases.len() > 1 || converters > 1 {
+            errors.push(format!(
+                "{}: custom type {name} is declared {} times, its converter {converters} times",
+                path.display(),
+                aliases.len(),
+            ));
+        }
+        if builtin == "bytes" {
+            for target in aliases.iter().filter(|target| target.trim() != bytes_type) {
+                errors.push(format!(
+                    "{}: custom type {name} is an alias of {}, not {bytes_type}",
+                    path.display(),
+                    target.trim(),
+                ));
+            }
+        }
+    }
 }